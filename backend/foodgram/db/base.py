@@ -0,0 +1,75 @@
+import psycopg2 as Database
+from django.db.backends.postgresql import base
+from psycopg2 import extensions
+
+from .pool import ConnectionPool, get_pool
+
+
+def _is_usable(conn):
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute('SELECT 1')
+        if (conn.get_transaction_status()
+                != extensions.TRANSACTION_STATUS_IDLE):
+            conn.rollback()
+    except Database.Error:
+        return False
+    return True
+
+
+def _reset(conn):
+    """Возвращает соединение в исходное состояние перед возвратом в пул."""
+    if conn.closed:
+        return False
+    try:
+        status = conn.get_transaction_status()
+        if status == extensions.TRANSACTION_STATUS_UNKNOWN:
+            return False
+        if status != extensions.TRANSACTION_STATUS_IDLE:
+            conn.rollback()
+    except Database.Error:
+        return False
+    return True
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    """PostgreSQL с пулом соединений процесса.
+
+    Django открывает соединение через get_new_connection и закрывает
+    через _close: здесь они берут соединение из пула и возвращают его
+    обратно. Настройки пула читаются из ключа POOL в DATABASES.
+    """
+
+    def get_pool(self):
+        options = self.settings_dict.get('POOL', {})
+        return get_pool(self.alias, lambda: ConnectionPool(
+            connect=self._connect,
+            size=options.get('SIZE', 10),
+            max_lifetime=options.get('MAX_LIFETIME'),
+            timeout=options.get('TIMEOUT', 10),
+            check=_is_usable if options.get('HEALTH_CHECK', True) else None,
+            error=Database.OperationalError,
+        ))
+
+    def _connect(self):
+        return super().get_new_connection(self.get_connection_params())
+
+    def get_new_connection(self, conn_params):
+        connection = self.get_pool().acquire()
+        # Новое соединение настраивается в родительском методе, у взятого
+        # из пула уровень изоляции сохранился с момента открытия.
+        self.isolation_level = self.settings_dict['OPTIONS'].get(
+            'isolation_level', connection.isolation_level)
+        return connection
+
+    def _close(self):
+        if self.connection is None:
+            return
+        pool = self.get_pool()
+        with self.wrap_database_errors:
+            if self.in_atomic_block:
+                # Обёртка продолжит ссылаться на соединение до отката
+                # транзакции, поэтому вернуть его в пул нельзя.
+                pool.discard(self.connection)
+            else:
+                pool.release(self.connection, _reset(self.connection))
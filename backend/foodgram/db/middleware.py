@@ -0,0 +1,29 @@
+from django.db import connections
+
+
+def _release_connections():
+    for conn in connections.all():
+        if not conn.in_atomic_block:
+            conn.close_if_unusable_or_obsolete()
+
+
+class ReleaseConnectionsMiddleware:
+    """Возвращает соединения с базой в том потоке, который их открыл.
+
+    Под ASGI Django 3.0 сигналы request_started и request_finished,
+    закрывающие соединения, выполняются в других потоках, чем view,
+    и соединения потоков исполнителя остаются занятыми. Открытые
+    внутри транзакции соединения не трогаются. Потоковый ответ
+    отдаёт тело позже, его соединение освобождается в начале
+    следующего запроса этого потока.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        _release_connections()
+        response = self.get_response(request)
+        if not response.streaming:
+            _release_connections()
+        return response
@@ -0,0 +1,168 @@
+import os
+import threading
+import time
+from collections import deque
+
+
+class PoolStats:
+    __slots__ = ('checkouts', 'waits', 'wait_seconds', 'timeouts',
+                 'created', 'recycled', 'failed_checks')
+
+    def __init__(self):
+        for name in self.__slots__:
+            setattr(self, name, 0)
+
+
+class ConnectionPool:
+    """Ограниченный пул соединений одного процесса.
+
+    Соединение выдаётся из свободных (последнее возвращённое — первым),
+    новое открывается, пока открытых меньше size, иначе поток ждёт
+    освобождения не дольше timeout секунд. Соединения старше
+    max_lifetime закрываются при выдаче и возврате, при выдаче
+    свободное соединение проверяется функцией check.
+    """
+
+    def __init__(self, connect, size, max_lifetime=None, timeout=10,
+                 check=None, error=RuntimeError):
+        self.size = size
+        self.max_lifetime = max_lifetime
+        self.timeout = timeout
+        self.stats = PoolStats()
+        self._connect = connect
+        self._check = check
+        self._error = error
+        self._idle = deque()
+        self._born = {}
+        self._opened = 0
+        self._condition = threading.Condition()
+
+    @property
+    def idle(self):
+        return len(self._idle)
+
+    @property
+    def in_use(self):
+        return self._opened - len(self._idle)
+
+    def acquire(self):
+        deadline = time.monotonic() + self.timeout
+        while True:
+            conn, born = self._take(deadline)
+            if conn is None:
+                return self._open()
+            if self._check is None or self._check(conn):
+                self._born[id(conn)] = born
+                return conn
+            with self._condition:
+                self.stats.failed_checks += 1
+            self._drop(conn)
+
+    def release(self, conn, reusable=True):
+        born = self._born.pop(id(conn), None)
+        if born is None:
+            conn.close()
+            return
+        if reusable and self._expired(born):
+            with self._condition:
+                self.stats.recycled += 1
+            reusable = False
+        if not reusable:
+            self._drop(conn)
+            return
+        with self._condition:
+            self._idle.append((conn, born))
+            self._condition.notify()
+
+    def discard(self, conn):
+        if self._born.pop(id(conn), None) is None:
+            conn.close()
+        else:
+            self._drop(conn)
+
+    def close(self):
+        with self._condition:
+            idle, self._idle = self._idle, deque()
+            self._opened -= len(idle)
+        for conn, _ in idle:
+            conn.close()
+
+    def _take(self, deadline):
+        """Свободное соединение или (None, None), если можно открыть новое."""
+        with self._condition:
+            self.stats.checkouts += 1
+            waited = False
+            while True:
+                while self._idle:
+                    conn, born = self._idle.pop()
+                    if not self._expired(born):
+                        return conn, born
+                    self._opened -= 1
+                    self.stats.recycled += 1
+                    conn.close()
+                if self._opened < self.size:
+                    self._opened += 1
+                    return None, None
+                if not waited:
+                    waited = True
+                    self.stats.waits += 1
+                started = time.monotonic()
+                notified = self._condition.wait(max(deadline - started, 0))
+                self.stats.wait_seconds += time.monotonic() - started
+                if not notified:
+                    self.stats.timeouts += 1
+                    raise self._error(
+                        f'Нет свободного соединения в пуле из {self.size} '
+                        f'за {self.timeout} с')
+
+    def _open(self):
+        try:
+            conn = self._connect()
+        except Exception:
+            with self._condition:
+                self._opened -= 1
+                self._condition.notify()
+            raise
+        self._born[id(conn)] = time.monotonic()
+        with self._condition:
+            self.stats.created += 1
+        return conn
+
+    def _drop(self, conn):
+        try:
+            conn.close()
+        finally:
+            with self._condition:
+                self._opened -= 1
+                self._condition.notify()
+
+    def _expired(self, born):
+        return (self.max_lifetime is not None
+                and time.monotonic() - born >= self.max_lifetime)
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(alias, factory):
+    """Пул соединения alias в текущем процессе.
+
+    Ключ включает pid: после fork (воркеры gunicorn с --preload)
+    дочерний процесс не использует сокеты родителя, а создаёт свой пул.
+    """
+    key = (os.getpid(), alias)
+    pool = _pools.get(key)
+    if pool is None:
+        with _pools_lock:
+            pool = _pools.get(key)
+            if pool is None:
+                pool = _pools[key] = factory()
+    return pool
+
+
+def pools():
+    """Пулы текущего процесса по имени соединения."""
+    pid = os.getpid()
+    return {alias: pool for (owner, alias), pool in list(_pools.items())
+            if owner == pid}
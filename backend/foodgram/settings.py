@@ -17,6 +17,8 @@ ALLOWED_HOSTS = ['*']
 
 RECIPES_LIMIT = 3
 
+INGREDIENT_SEARCH_LIMIT = 20
+
 # Application definition
 
 INSTALLED_APPS = [
@@ -38,6 +40,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'recipe.metrics.MetricsMiddleware',
+    'foodgram.db.middleware.ReleaseConnectionsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -76,17 +80,49 @@ WSGI_APPLICATION = 'foodgram.wsgi.application'
 # }
 
 
+DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', 10))
+
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.postgresql',
+        'ENGINE': ('foodgram.db' if DB_POOL_SIZE
+                   else 'django.db.backends.postgresql'),
         'NAME': os.environ.get('DB_NAME'),
         'USER': os.environ.get('POSTGRES_USER'),
         'PASSWORD': os.environ.get('POSTGRES_PASSWORD'),
         'HOST': os.environ.get('DB_HOST'),
         'PORT': os.environ.get('DB_PORT'),
+        'POOL': {
+            'SIZE': DB_POOL_SIZE,
+            'MAX_LIFETIME': int(
+                os.environ.get('DB_POOL_MAX_LIFETIME', 1800)) or None,
+            'TIMEOUT': float(os.environ.get('DB_POOL_TIMEOUT', 10)),
+            'HEALTH_CHECK': os.environ.get(
+                'DB_POOL_HEALTH_CHECK', 'True') == 'True',
+        },
+    }
+}
+
+
+CACHES = {
+    'default': {
+        'BACKEND': os.environ.get(
+            'CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.environ.get('CACHE_LOCATION', ''),
     }
 }
 
+RECIPE_PAYLOAD_CACHE_SIZE = int(
+    os.environ.get('RECIPE_PAYLOAD_CACHE_SIZE', 1000))
+RECIPE_PAYLOAD_CACHE_ALIAS = os.environ.get('RECIPE_PAYLOAD_CACHE_ALIAS')
+
+METRICS_QUERY_BUDGET = int(os.environ.get('METRICS_QUERY_BUDGET', 20))
+
+AUTH_CACHE_TTL = int(os.environ.get('AUTH_CACHE_TTL', 60))
+AUTH_CACHE_SIZE = int(os.environ.get('AUTH_CACHE_SIZE', 10000))
+
+SESSION_ENGINE = os.environ.get(
+    'SESSION_ENGINE', 'django.contrib.sessions.backends.db')
+
 
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -112,8 +148,8 @@ REST_FRAMEWORK = {
         'rest_framework.permissions.AllowAny',
     ),
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework.authentication.TokenAuthentication',
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'recipe.api.authentication.CachedTokenAuthentication',
+        'recipe.api.authentication.CachedJWTAuthentication',
         'rest_framework.authentication.SessionAuthentication',
     ),
     'DEFAULT_SCHEMA_CLASS': 'drf_spectacular.openapi.AutoSchema',
@@ -193,7 +229,7 @@ ACCOUNT_EMAIL_REQUIRED = True
 ACCOUNT_USERNAME_REQUIRED = False
 
 AUTHENTICATION_BACKENDS = (
-    "django.contrib.auth.backends.ModelBackend",
+    "recipe.api.authentication.CachedModelBackend",
 )
 
 EMAIL_USE_TLS = True
@@ -220,6 +256,17 @@ STATIC_ROOT = os.path.join(BASE_DIR, 'backend_static')
 MEDIA_URL = "/media/"
 MEDIA_ROOT = os.path.join(BASE_DIR, "media")
 
+IMAGE_RENDITION_WORKERS = int(os.environ.get('IMAGE_RENDITION_WORKERS', 2))
+
+FEED_LENGTH = int(os.environ.get('FEED_LENGTH', 500))
+FEED_FANOUT_LIMIT = int(os.environ.get('FEED_FANOUT_LIMIT', 10000))
+FEED_FANOUT_WORKERS = int(os.environ.get('FEED_FANOUT_WORKERS', 1))
+
+SIMILAR_RECIPES_LIMIT = int(os.environ.get('SIMILAR_RECIPES_LIMIT', 10))
+SIMILAR_TAG_BOOST = float(os.environ.get('SIMILAR_TAG_BOOST', 0.2))
+SIMILARITY_INDEX_PATH = os.environ.get(
+    'SIMILARITY_INDEX_PATH', os.path.join(BASE_DIR, 'var', 'similarity.index'))
+
 
 BASE_URL = 'http://api.foodgram.students.nomoredomains.icu'
 
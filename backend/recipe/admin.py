@@ -1,7 +1,8 @@
 from django.contrib import admin
 
-from .models import (Favorite, Follow, IngredientRecord, Ingredient, Recipe,
-                     ShopList, Tag)
+from .models import (FeedEntry, Favorite, Follow, IngredientRecord,
+                     Ingredient, Profile, Recipe, ShopList, ShopListIngredient,
+                     Tag)
 
 
 @admin.register(Tag)
@@ -12,9 +13,33 @@ class TagAdmin(admin.ModelAdmin):
     prepopulated_fields = {'slug': ('name',)}
 
 
-admin.site.register(Recipe)
+@admin.register(Recipe)
+class RecipeAdmin(admin.ModelAdmin):
+
+    list_display = ('id', 'name', 'author', 'favorites_count',
+                    'shopping_list_count')
+    list_display_links = ('id', 'name',)
+    list_select_related = ('author',)
+    readonly_fields = ('favorites_count', 'shopping_list_count')
+
+
+@admin.register(Profile)
+class ProfileAdmin(admin.ModelAdmin):
+
+    list_display = ('user', 'recipes_count', 'followers_count')
+    list_select_related = ('user',)
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
 admin.site.register(Ingredient)
 admin.site.register(Follow)
 admin.site.register(ShopList)
 admin.site.register(Favorite)
 admin.site.register(IngredientRecord)
+admin.site.register(ShopListIngredient)
+admin.site.register(FeedEntry)
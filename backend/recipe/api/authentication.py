@@ -0,0 +1,126 @@
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.contrib.auth.backends import ModelBackend
+from rest_framework.authentication import TokenAuthentication
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
+
+from ..versions import auth_key, get_versions
+
+
+def _snapshot(instance):
+    fields = instance._meta.concrete_fields
+    return (type(instance), instance._state.db,
+            tuple(getattr(instance, field.attname) for field in fields))
+
+
+def _restore(snapshot):
+    model, db, values = snapshot
+    names = [field.attname for field in model._meta.concrete_fields]
+    return model.from_db(db, names, values)
+
+
+class AuthCache:
+    """Снимки пользователей, найденных по токену, JWT или сессии.
+
+    Запись живёт не дольше ttl секунд и хранит версию
+    ``auth:<id пользователя>``: её повышают сохранение и удаление
+    пользователя, удаление токена и выход, после чего запись считается
+    промахом во всех процессах с общим кэшем (memcached, не база:
+    версия читается на каждом попадании). Из снимка на каждый
+    запрос собирается новый экземпляр модели, поэтому запросы не делят
+    объект пользователя.
+    """
+
+    def __init__(self, max_entries, ttl):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        if not self.ttl:
+            return None
+        with self._lock:
+            entry = self._entries.get(key)
+        if entry is None:
+            return None
+        snapshots, user_id, version, expires = entry
+        if (expires < time.monotonic()
+                or version != self._version(user_id)):
+            self.invalidate(key)
+            return None
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+        return [_restore(snapshot) for snapshot in snapshots]
+
+    def set(self, key, user, *related):
+        if not self.ttl:
+            return
+        entry = (
+            [_snapshot(instance) for instance in (user, *related)],
+            user.pk, self._version(user.pk),
+            time.monotonic() + self.ttl,
+        )
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    @staticmethod
+    def _version(user_id):
+        # Только чтение: отсутствующая версия считается нулевой, запись
+        # в кэш на пути аутентификации не нужна.
+        return get_versions(auth_key(user_id))[0]
+
+    def invalidate(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    def authenticate_credentials(self, key):
+        cached = auth_cache.get(('token', key))
+        if cached is None:
+            user, token = super().authenticate_credentials(key)
+            auth_cache.set(('token', key), user, token)
+            return user, token
+        user, token = cached
+        token.user = user
+        return user, token
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    def get_user(self, validated_token):
+        user_id = validated_token.get(jwt_settings.USER_ID_CLAIM)
+        cached = auth_cache.get(('jwt', user_id))
+        if cached is None:
+            user = super().get_user(validated_token)
+            auth_cache.set(('jwt', user_id), user)
+            return user
+        return cached[0]
+
+
+class CachedModelBackend(ModelBackend):
+    """ModelBackend, который берёт пользователя сессии из AuthCache."""
+
+    def get_user(self, user_id):
+        cached = auth_cache.get(('user', user_id))
+        if cached is None:
+            user = super().get_user(user_id)
+            if user is not None:
+                auth_cache.set(('user', user_id), user)
+            return user
+        return cached[0]
+
+
+auth_cache = AuthCache(settings.AUTH_CACHE_SIZE, settings.AUTH_CACHE_TTL)
@@ -1,6 +1,22 @@
 import django_filters as filters
+from django import forms
+from django.db.models import Exists, OuterRef
+from django_filters.rest_framework import DjangoFilterBackend
+from django_filters.widgets import BooleanWidget
 
-from ..models import Ingredient
+from ..ingredient_index import ingredient_index
+from ..models import Favorite, Ingredient, Recipe, ShopList
+from ..search import search_recipes
+from .pagination import LimitPageNumberPagination
+
+
+class IngredientIndexFilterBackend(DjangoFilterBackend):
+
+    def filter_queryset(self, request, queryset, view):
+        name = request.query_params.get('name')
+        if name and 'measurement_unit' not in request.query_params:
+            return ingredient_index.search(name)
+        return super().filter_queryset(request, queryset, view)
 
 
 class IngredientNameFilter(filters.FilterSet):
@@ -11,39 +27,66 @@ class IngredientNameFilter(filters.FilterSet):
         fields = ('name', 'measurement_unit')
 
 
+class SlugListField(forms.Field):
+    widget = forms.SelectMultiple
+
+    def to_python(self, value):
+        return [slug for slug in value or () if slug]
+
+
+class SlugListFilter(filters.Filter):
+    field_class = SlugListField
+
+
+class IntegerFilter(filters.NumberFilter):
+    field_class = forms.IntegerField
+
+
 class RecipeFilter(filters.FilterSet):
 
-    tags = filters.AllValuesMultipleFilter(field_name='tags__slug')
+    tags = SlugListFilter(method='filter_tags')
 
     is_favorited = filters.BooleanFilter(
-        field_name='favorites__recipe',
         method='filter_favorited',
-        lookup_expr='isnull'
+        widget=BooleanWidget()
     )
 
     is_in_shopping_cart = filters.BooleanFilter(
-        field_name='shopping_list__recipe',
         method='filter_shopping_cart',
-        lookup_expr='isnull'
+        widget=BooleanWidget()
     )
 
-    author = filters.CharFilter(
-        field_name='author__id',
-        lookup_expr='contains'
-    )
+    author = IntegerFilter(field_name='author_id')
+
+    search = filters.CharFilter(method='filter_search')
+
+    def filter_tags(self, queryset, name, value):
+        return queryset.filter(Exists(
+            Recipe.tags.through.objects.filter(
+                recipe_id=OuterRef('pk'), tag__slug__in=value
+            )
+        ))
+
+    def filter_search(self, queryset, name, value):
+        queryset, rank = search_recipes(queryset, value)
+        cursor = LimitPageNumberPagination.cursor_query_param
+        if cursor in self.request.query_params:
+            return queryset
+        return queryset.order_by(rank.desc(), '-id')
+
+    def _filter_related(self, queryset, model, value):
+        user = self.request.user
+        if not user.is_authenticated:
+            return queryset.none() if value else queryset
+        related = Exists(model.objects.filter(
+            user=user, recipe_id=OuterRef('pk')
+        ))
+        if value:
+            return queryset.filter(related)
+        return queryset.exclude(related)
 
     def filter_shopping_cart(self, queryset, name, value):
-        lookup = '__'.join([name, 'isnull'])
-        return queryset.exclude(
-            **{lookup: value}
-        ).filter(
-            shopping_list__user=self.request.user
-        )
+        return self._filter_related(queryset, ShopList, value)
 
     def filter_favorited(self, queryset, name, value):
-        lookup = '__'.join([name, 'isnull'])
-        return queryset.exclude(
-            **{lookup: value}
-        ).filter(
-            favorites__user=self.request.user
-        )
+        return self._filter_related(queryset, Favorite, value)
@@ -0,0 +1,52 @@
+import hashlib
+
+from django.utils.cache import (get_conditional_response, patch_cache_control,
+                                patch_vary_headers)
+from django.utils.http import http_date, quote_etag
+
+
+class ConditionalGetMixin:
+    cache_max_age = 0
+
+    def get_validators(self, request, *args, **kwargs):
+        """Возвращает (части ETag, дату изменения) без сериализации ответа.
+
+        Если частей нет (None), ответ отдаётся без проверки условий.
+        """
+        return None, None
+
+    def list(self, request, *args, **kwargs):
+        return self._conditional_get(
+            super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self._conditional_get(
+            super().retrieve, request, *args, **kwargs)
+
+    def _conditional_get(self, handler, request, *args, **kwargs):
+        parts, last_modified = self.get_validators(request, *args, **kwargs)
+        if parts is None:
+            return handler(request, *args, **kwargs)
+        personal = request.user.is_authenticated
+        parts = (request.get_full_path(), request.user.pk, *parts)
+        etag = quote_etag(
+            hashlib.md5(repr(parts).encode()).hexdigest())
+        if personal:
+            last_modified = None
+        timestamp = last_modified and int(last_modified.timestamp())
+        response = get_conditional_response(
+            request, etag=etag, last_modified=timestamp)
+        if response is None:
+            response = handler(request, *args, **kwargs)
+            if response.status_code != 200:
+                return response
+        response['ETag'] = etag
+        if last_modified:
+            response['Last-Modified'] = http_date(timestamp)
+        if personal:
+            patch_cache_control(response, private=True, no_cache=True)
+        else:
+            patch_cache_control(
+                response, public=True, max_age=self.cache_max_age)
+        patch_vary_headers(response, ('Authorization', 'Cookie'))
+        return response
@@ -1,6 +1,99 @@
+import base64
+from collections import OrderedDict
+
+from django.db.models import QuerySet
+from rest_framework.exceptions import NotFound
 from rest_framework.pagination import PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
 
 
 class LimitPageNumberPagination(PageNumberPagination):
+    """Постраничная навигация по номеру страницы или по курсору.
+
+    Режим курсора включается параметром ``cursor`` (для первой страницы —
+    пустым): страница выбирается условием по ключу сортировки вместо
+    OFFSET, поэтому её стоимость не зависит от глубины; списки, которые
+    не являются queryset или не отсортированы по id, листаются по номерам
+    страниц и с параметром ``cursor``. Общее количество
+    в этом режиме считается только при ``count=true``.
+    """
     page_size = 6
     page_size_query_param = 'limit'
+    cursor_query_param = 'cursor'
+    count_query_param = 'count'
+    cursor_mode = False
+
+    def paginate_queryset(self, queryset, request, view=None):
+        ordering = None
+        if (self.cursor_query_param in request.query_params
+                and isinstance(queryset, QuerySet)):
+            ordering = self._get_ordering(queryset)
+        if ordering is None:
+            return super().paginate_queryset(queryset, request, view)
+        self.cursor_mode = True
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        self.field, self.descending = ordering
+        direction, value = self._decode_cursor(
+            request.query_params[self.cursor_query_param])
+        self.count = None
+        if request.query_params.get(self.count_query_param) in ('1', 'true'):
+            self.count = queryset.count()
+        forward = direction != 'p'
+        if value is not None:
+            lookup = 'lt' if forward == self.descending else 'gt'
+            queryset = queryset.filter(
+                **{f'{self.field}__{lookup}': value})
+        if not forward:
+            queryset = queryset.reverse()
+        rows = list(queryset[:self.page_size + 1])
+        has_more = len(rows) > self.page_size
+        rows = rows[:self.page_size]
+        if not forward:
+            rows.reverse()
+        self.next_value = self.previous_value = None
+        if rows and (has_more or not forward):
+            self.next_value = getattr(rows[-1], self.field)
+        if rows and (value is not None and (forward or has_more)):
+            self.previous_value = getattr(rows[0], self.field)
+        return rows
+
+    def get_paginated_response(self, data):
+        if not self.cursor_mode:
+            return super().get_paginated_response(data)
+        return Response(OrderedDict([
+            ('count', self.count),
+            ('next', self._cursor_link('n', self.next_value)),
+            ('previous', self._cursor_link('p', self.previous_value)),
+            ('results', data),
+        ]))
+
+    def _cursor_link(self, direction, value):
+        if value is None:
+            return None
+        url = self.request.build_absolute_uri()
+        url = remove_query_param(url, self.count_query_param)
+        token = base64.urlsafe_b64encode(
+            f'{direction}:{value}'.encode()).decode()
+        return replace_query_param(url, self.cursor_query_param, token)
+
+    @staticmethod
+    def _get_ordering(queryset):
+        ordering = queryset.query.order_by or queryset.model._meta.ordering
+        if len(ordering) != 1 or ordering[0].lstrip('-') not in ('id', 'pk'):
+            return None
+        return 'id', ordering[0].startswith('-')
+
+    @staticmethod
+    def _decode_cursor(cursor):
+        if not cursor:
+            return 'n', None
+        try:
+            direction, value = base64.urlsafe_b64decode(
+                cursor.encode()).decode().split(':')
+            if direction not in ('n', 'p'):
+                raise ValueError
+            return direction, int(value)
+        except (ValueError, UnicodeDecodeError):
+            raise NotFound('Некорректный курсор')
@@ -0,0 +1,94 @@
+import threading
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+
+from ..versions import get_versions, user_key
+
+
+class RecipePayloadCache:
+    """LRU-кэш общей для всех пользователей части ответа с рецептом.
+
+    Записи хранятся по id рецепта вместе с отметкой (время изменения
+    рецепта, версии тегов, ингредиентов и автора рецепта, адрес сайта):
+    запись с устаревшей отметкой считается промахом. Если задан
+    ``backend`` (любой объект с API кэша Django), записи дублируются в нём,
+    чтобы ими пользовались все процессы.
+    """
+
+    def __init__(self, max_entries, backend=None):
+        self.max_entries = max_entries
+        self.backend = backend
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def stamps(recipes, request):
+        author_ids = sorted({recipe.author_id for recipe in recipes})
+        tag, ingredient, *authors = get_versions(
+            'tag', 'ingredient', *map(user_key, author_ids))
+        authors = dict(zip(author_ids, authors))
+        origin = request.build_absolute_uri('/') if request else ''
+        return {
+            recipe.pk: (recipe.updated_at.isoformat(), tag, ingredient,
+                        authors[recipe.author_id], origin)
+            for recipe in recipes
+        }
+
+    def get_many(self, stamps):
+        found, missing = {}, []
+        with self._lock:
+            for recipe_id, stamp in stamps.items():
+                entry = self._entries.get(recipe_id)
+                if entry is not None and entry[0] == stamp:
+                    self._entries.move_to_end(recipe_id)
+                    found[recipe_id] = entry[1]
+                else:
+                    missing.append(recipe_id)
+        if missing and self.backend is not None:
+            shared = self.backend.get_many(map(self._key, missing))
+            for recipe_id in missing:
+                entry = shared.get(self._key(recipe_id))
+                if entry is not None and entry[0] == stamps[recipe_id]:
+                    found[recipe_id] = entry[1]
+                    self._remember(recipe_id, entry)
+        return found
+
+    def set_many(self, entries):
+        for recipe_id, entry in entries.items():
+            self._remember(recipe_id, entry)
+        if self.backend is not None:
+            self.backend.set_many({
+                self._key(recipe_id): entry
+                for recipe_id, entry in entries.items()
+            })
+
+    def invalidate(self, recipe_ids):
+        with self._lock:
+            for recipe_id in recipe_ids:
+                self._entries.pop(recipe_id, None)
+        if self.backend is not None:
+            self.backend.delete_many(map(self._key, recipe_ids))
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def _remember(self, recipe_id, entry):
+        with self._lock:
+            self._entries[recipe_id] = entry
+            self._entries.move_to_end(recipe_id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    @staticmethod
+    def _key(recipe_id):
+        return f'recipe:payload:{recipe_id}'
+
+
+recipe_payload_cache = RecipePayloadCache(
+    settings.RECIPE_PAYLOAD_CACHE_SIZE,
+    backend=(caches[settings.RECIPE_PAYLOAD_CACHE_ALIAS]
+             if settings.RECIPE_PAYLOAD_CACHE_ALIAS else None),
+)
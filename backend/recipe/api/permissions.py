@@ -22,7 +22,7 @@ class IsAuthorRecipeOrReadOnly(BasePermission):
         if (request.method in ['PUT', 'PATCH', 'DELETE']
                 and not request.user.is_anonymous):
             return (
-                request.user == obj.author
+                request.user.pk == obj.author_id
                 or request.user.is_superuser
                 or request.user.is_admin()
             )
@@ -1,8 +1,8 @@
 from django.urls import include, path
 from rest_framework.routers import DefaultRouter
 
-from .views import (IngredientViewSet, RecipeViewSet, TagViewSet,
-                    UserFollowView, UserViewSet)
+from .views import (IngredientViewSet, MetricsView, RecipeViewSet,
+                    TagViewSet, UserFollowView, UserViewSet)
 
 router = DefaultRouter()
 
@@ -19,6 +19,7 @@ urlpatterns = [
         UserFollowView.as_view(),
         name='subscriptions'
     ),
+    path('metrics/', MetricsView.as_view(), name='metrics'),
     path('', include(router.urls)),
 
 ]
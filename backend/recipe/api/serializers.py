@@ -1,9 +1,51 @@
+from django.db import transaction
+from django.db.models import Manager, Prefetch
+from django.db.models import prefetch_related_objects
 from drf_extra_fields.fields import Base64ImageField
 from foodgram import settings
 from rest_framework import serializers
 
-from ..models import (Favorite, Follow, Ingredient, IngredientRecord, Recipe,
-                      ShopList, Tag, User)
+from ..feed import schedule_fan_out
+from ..images import rendition_names, schedule_renditions
+from ..models import (Ingredient, IngredientRecord, Recipe,
+                      ShopListIngredient, Tag, User)
+from .payload_cache import recipe_payload_cache
+from .viewer import get_viewer
+
+
+def get_recipes_limit(request):
+    limit = None
+    if request is not None:
+        limit = request.query_params.get('recipes_limit')
+    try:
+        limit = int(limit)
+    except (TypeError, ValueError):
+        return settings.RECIPES_LIMIT
+    return limit if limit > 0 else settings.RECIPES_LIMIT
+
+
+class ImageRenditionsField(serializers.ReadOnlyField):
+
+    def __init__(self, **kwargs):
+        kwargs['source'] = '*'
+        super().__init__(**kwargs)
+
+    def to_representation(self, recipe):
+        if not recipe.image:
+            return None
+        request = self.context.get('request')
+        url = recipe.image.storage.url
+        build_url = request.build_absolute_uri if request else str
+        names = rendition_names(recipe.image.name)
+        return {
+            size: {
+                extension: build_url(
+                    url(name) if recipe.image_renditions_ready
+                    else recipe.image.url)
+                for extension, name in extensions.items()
+            }
+            for size, extensions in names.items()
+        }
 
 
 class UserCreateSerializer(serializers.ModelSerializer):
@@ -36,6 +78,15 @@ class UserCreateSerializer(serializers.ModelSerializer):
         return user
 
 
+class UserListSerializer(serializers.ListSerializer):
+
+    def to_representation(self, data):
+        users = list(data.all() if isinstance(data, Manager) else data)
+        get_viewer(self.context.get('request')).prime(
+            follow=[user.pk for user in users])
+        return super().to_representation(users)
+
+
 class UserSerializer(serializers.ModelSerializer):
 
     is_subscribed = serializers.SerializerMethodField('follow')
@@ -44,16 +95,10 @@ class UserSerializer(serializers.ModelSerializer):
         model = User
         fields = ('email', 'id', 'username', 'first_name',
                   'last_name', 'is_subscribed')
+        list_serializer_class = UserListSerializer
 
     def follow(self, obj):
-        request = self.context.get('request')
-        if (Follow.objects.filter(
-                author__username=obj.username,
-                user__username=request.user.username
-        ).exists()
-                or obj.username == request.user.username):
-            return True
-        return False
+        return get_viewer(self.context.get('request')).follows(obj.pk)
 
 
 class TagSerializers(serializers.ModelSerializer):
@@ -82,10 +127,11 @@ class IngredientInRecipeSerializer(serializers.ModelSerializer):
 
 
 class RecipeFollowSerializer(serializers.ModelSerializer):
+    image_renditions = ImageRenditionsField()
 
     class Meta:
         model = Recipe
-        fields = ('id', 'name', 'image', 'cooking_time')
+        fields = ('id', 'name', 'image', 'image_renditions', 'cooking_time')
 
 
 class UserFollowSerializer(serializers.ModelSerializer):
@@ -101,16 +147,22 @@ class UserFollowSerializer(serializers.ModelSerializer):
                   'recipes_count', )
 
     def follow(self, obj):
-        return Follow.objects.filter(author__username=obj.username).exists()
+        return get_viewer(self.context.get('request')).follows(obj.pk)
 
     def count(self, obj):
-        count = Recipe.objects.filter(author__username=obj.username).count()
-        return count
+        if hasattr(obj, 'recipes_count'):
+            return obj.recipes_count
+        profile = getattr(obj, 'profile', None)
+        if profile is None:
+            return obj.recipes.count()
+        return profile.recipes_count
 
     def get_recipes(self, obj):
-        recipes = Recipe.objects.filter(author__username=obj.username)[
-            :settings.RECIPES_LIMIT]
         request = self.context.get('request')
+        if hasattr(obj, 'latest_recipes'):
+            recipes = obj.latest_recipes
+        else:
+            recipes = obj.recipes.all()[:get_recipes_limit(request)]
         context = {'request': request}
         return RecipeFollowSerializer(
             recipes,
@@ -119,6 +171,7 @@ class UserFollowSerializer(serializers.ModelSerializer):
 
 
 class RecipeFavoriteOrShopList(serializers.ModelSerializer):
+    image_renditions = ImageRenditionsField()
 
     class Meta:
         model = Recipe
@@ -126,6 +179,7 @@ class RecipeFavoriteOrShopList(serializers.ModelSerializer):
             'id',
             'name',
             'image',
+            'image_renditions',
             'cooking_time',
         )
 
@@ -142,10 +196,26 @@ class IngredientInRecipeSerializerToCreateRecipe(serializers.ModelSerializer):
         fields = ('id', 'name', 'measurement_unit', 'amount',)
 
 
+def recipe_representation_lookups():
+    ingredients = Prefetch(
+        'ingredientrecord_set',
+        queryset=IngredientRecord.objects.select_related('ingredient')
+    )
+    return ['author', 'tags', ingredients]
+
+
+class RecipeListSerializer(serializers.ListSerializer):
+
+    def to_representation(self, data):
+        recipes = data.all() if isinstance(data, Manager) else data
+        return self.child.to_representation_many(list(recipes))
+
+
 class RecipeSerializer(serializers.ModelSerializer):
 
     author = UserSerializer(read_only=True)
     image = Base64ImageField()
+    image_renditions = ImageRenditionsField()
     tags = TagSerializers(read_only=True, many=True)
     ingredients = serializers.SerializerMethodField()
     is_favorited = serializers.SerializerMethodField('favorited')
@@ -153,62 +223,112 @@ class RecipeSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Recipe
-        fields = '__all__'
+        exclude = (
+            'image_renditions_ready', 'updated_at', *Recipe.DERIVED_FIELDS
+        )
+        list_serializer_class = RecipeListSerializer
+
+    def to_representation(self, instance):
+        return self.to_representation_many([instance])[0]
+
+    def to_representation_many(self, recipes):
+        request = self.context.get('request')
+        stamps = recipe_payload_cache.stamps(recipes, request)
+        payloads = recipe_payload_cache.get_many(stamps)
+        misses = [recipe for recipe in recipes if recipe.pk not in payloads]
+        lookups = recipe_representation_lookups() if misses else ()
+        if lookups:
+            prefetch_related_objects(misses, *lookups)
+        viewer = self._prime_viewer(recipes)
+        if misses:
+            fresh = {
+                recipe.pk: (stamps[recipe.pk], self._shared_payload(
+                    super(RecipeSerializer, self).to_representation(recipe)))
+                for recipe in misses
+            }
+            recipe_payload_cache.set_many(fresh)
+            payloads.update(
+                (recipe_id, entry[1]) for recipe_id, entry in fresh.items())
+        return [
+            self._personal_payload(payloads[recipe.pk], recipe, viewer)
+            for recipe in recipes
+        ]
+
+    @staticmethod
+    def _shared_payload(payload):
+        payload['author']['is_subscribed'] = False
+        payload['is_favorited'] = False
+        payload['is_in_shopping_cart'] = False
+        return payload
+
+    @staticmethod
+    def _personal_payload(payload, recipe, viewer):
+        payload = payload.copy()
+        payload['author'] = {
+            **payload['author'],
+            'is_subscribed': viewer.follows(recipe.author_id),
+        }
+        payload['is_favorited'] = viewer.favorited(recipe.pk)
+        payload['is_in_shopping_cart'] = viewer.in_cart(recipe.pk)
+        return payload
+
+    def _prime_viewer(self, recipes):
+        viewer = get_viewer(self.context.get('request'))
+        recipe_ids = [recipe.pk for recipe in recipes]
+        viewer.prime(
+            follow=[recipe.author_id for recipe in recipes],
+            favorite=recipe_ids, cart=recipe_ids)
+        return viewer
 
     def favorited(self, obj):
-        try:
-            request = self.context.get('request')
-            if request is None or request.user.is_anonymous:
-                return False
-            return Favorite.objects.filter(
-                user=request.user, recipe=obj
-            ).exists()
-        except TypeError:
-            return False
+        return get_viewer(self.context.get('request')).favorited(obj.pk)
 
     def shopping_cart(self, obj):
-        try:
-            request = self.context.get('request')
-            if request is None or request.user.is_anonymous:
-                return False
-            return ShopList.objects.filter(
-                user=request.user, recipe=obj
-            ).exists()
-        except TypeError:
-            return False
+        return get_viewer(self.context.get('request')).in_cart(obj.pk)
 
     def get_ingredients(self, obj):
-        qs = IngredientRecord.objects.filter(recipe=obj)
+        qs = obj.ingredientrecord_set.all()
         return IngredientInRecipeSerializerToCreateRecipe(qs, many=True).data
 
 
+class PantryRecipeSerializer(RecipeSerializer):
+    """Рецепт из поиска по кладовой: доля имеющихся ингредиентов и
+    недостающие ингредиенты."""
+
+    def to_representation_many(self, recipes):
+        payloads = super().to_representation_many(recipes)
+        for payload, recipe in zip(payloads, recipes):
+            payload['coverage'] = round(recipe.coverage, 4)
+            payload['missing_ingredients'] = [
+                ingredient for ingredient in payload['ingredients']
+                if ingredient['id'] in recipe.missing_ingredients
+            ]
+        return payloads
+
+
 class ShowRecipeSerializer(serializers.ModelSerializer):
     tags = TagSerializers(many=True, read_only=True)
     author = UserSerializer(read_only=True)
     ingredients = serializers.SerializerMethodField()
     is_favorited = serializers.SerializerMethodField('favorited')
     is_in_shopping_cart = serializers.SerializerMethodField('shopping_cart')
+    image_renditions = ImageRenditionsField()
 
     class Meta:
         model = Recipe
         fields = ('id', 'tags', 'author', 'ingredients',
                   'is_favorited', 'is_in_shopping_cart',
-                  'name', 'image', 'text', 'cooking_time')
+                  'name', 'image', 'image_renditions', 'text',
+                  'cooking_time')
 
     def favorited(self, obj):
-        request = self.context.get('request')
-        if request is None or request.user.is_anonymous:
-            return False
-        return Favorite.objects.filter(user=request.user, recipe=obj).exists()
+        return get_viewer(self.context.get('request')).favorited(obj.pk)
 
     def shopping_cart(self, obj):
-        request = self.context.get('request')
-        if request is None or request.user.is_anonymous:
-            return False
-        return ShopList.objects.filter(user=request.user, recipe=obj).exists()
+        return get_viewer(self.context.get('request')).in_cart(obj.pk)
 
     def get_ingredients(self, obj):
-        qs = IngredientRecord.objects.filter(recipe=obj)
+        qs = obj.ingredientrecord_set.select_related('ingredient')
         return IngredientInRecipeSerializerToCreateRecipe(qs, many=True).data
 
 
@@ -225,58 +345,146 @@ class CreateRecipeSerializer(serializers.ModelSerializer):
     image = Base64ImageField(max_length=None, use_url=True)
     author = UserSerializer(read_only=True)
     ingredients = AddIngredientToRecipeSerializer(many=True)
-    tags = serializers.PrimaryKeyRelatedField(
-        queryset=Tag.objects.all(), many=True
-    )
+    tags = serializers.ListField(child=serializers.IntegerField())
 
     class Meta:
         model = Recipe
         fields = ('id', 'tags', 'author', 'ingredients',
                   'name', 'image', 'text', 'cooking_time')
 
-    def create(self, validated_data):
-        tags_data = validated_data.pop('tags')
-        ingredients_data = validated_data.pop('ingredients')
+    def validate_tags(self, tag_ids):
+        tags = Tag.objects.in_bulk(tag_ids)
+        missing = set(tag_ids) - tags.keys()
+        if missing:
+            raise serializers.ValidationError(
+                f'Теги не найдены: {sorted(missing)}')
+        return list(tags.values())
+
+    @staticmethod
+    def _get_ingredient_amounts(ingredients_data):
+        amounts = {}
         for ingredient in ingredients_data:
             if ingredient['amount'] <= 0:
                 raise serializers.ValidationError(
                     'Количество ингридиента должно быть больше нуля!')
+            if ingredient['id'] in amounts:
+                raise serializers.ValidationError(
+                    'Ингредиенты в рецепте не должны повторяться!')
+            amounts[ingredient['id']] = ingredient['amount']
+        missing = amounts.keys() - Ingredient.objects.in_bulk(amounts).keys()
+        if missing:
+            raise serializers.ValidationError(
+                f'Ингредиенты не найдены: {sorted(missing)}')
+        return amounts
+
+    def create(self, validated_data):
+        tags_data = validated_data.pop('tags')
+        amounts = self._get_ingredient_amounts(
+            validated_data.pop('ingredients'))
         author = self.context.get('request').user
-        recipe = Recipe.objects.create(
-            author=author, **validated_data)
-        recipe.save()
-        recipe.tags.set(tags_data)
-        for ingredient in ingredients_data:
-            ingredient_model = Ingredient.objects.get(id=ingredient['id'])
-            amount = ingredient['amount']
-            IngredientRecord.objects.create(
-                ingredient=ingredient_model,
-                recipe=recipe,
-                amount=amount
+        with transaction.atomic():
+            recipe = Recipe.objects.create(
+                author=author, **validated_data)
+            self._set_tags(recipe, tags_data, current=())
+            IngredientRecord.objects.bulk_create(
+                IngredientRecord(
+                    ingredient_id=ingredient_id,
+                    recipe=recipe,
+                    amount=amount
+                )
+                for ingredient_id, amount in amounts.items()
             )
+            schedule_renditions(recipe)
+            schedule_fan_out(recipe)
         return recipe
 
-    def update(self, instance, validated_data):
-        ingredient_data = validated_data.pop('ingredients')
-        tags_data = validated_data.pop('tags')
-        for ingredient in ingredient_data:
-            if ingredient['amount'] <= 0:
-                raise serializers.ValidationError(
-                    'Количество ингридиента должно быть больше нуля!')
-        IngredientRecord.objects.filter(recipe=instance).delete()
-        for new_ingredient in ingredient_data:
-            IngredientRecord.objects.create(
-                ingredient=Ingredient.objects.get(id=new_ingredient['id']),
+    @staticmethod
+    def _set_tags(recipe, tags, current=None):
+        # Связи пишутся напрямую: время изменения рецепта уже обновлено
+        # его сохранением, отдельное обновление по m2m_changed не нужно.
+        through = Recipe.tags.through
+        if current is None:
+            current = through.objects.filter(
+                recipe=recipe).values_list('tag_id', flat=True)
+        current = set(current)
+        wanted = {tag.pk for tag in tags}
+        if current - wanted:
+            through.objects.filter(
+                recipe=recipe, tag_id__in=current - wanted).delete()
+        if wanted - current:
+            through.objects.bulk_create(
+                through(recipe=recipe, tag_id=tag_id)
+                for tag_id in wanted - current
+            )
+
+    @staticmethod
+    def _update_ingredients(instance, amounts):
+        """Обновляет ингредиенты рецепта и возвращает изменения
+        в виде ``{id ингредиента: (изменение количества, изменение
+        числа рецептов)}``."""
+        records = {
+            record.ingredient_id: record
+            for record in IngredientRecord.objects.filter(recipe=instance)
+        }
+        changes = {
+            ingredient_id: (-(record.amount or 0), -1)
+            for ingredient_id, record in records.items()
+            if ingredient_id not in amounts
+        }
+        changed = []
+        for ingredient_id, record in records.items():
+            if (ingredient_id in amounts
+                    and record.amount != amounts[ingredient_id]):
+                changes[ingredient_id] = (
+                    amounts[ingredient_id] - (record.amount or 0), 0)
+                record.amount = amounts[ingredient_id]
+                changed.append(record)
+        added = [
+            IngredientRecord(
+                ingredient_id=ingredient_id,
                 recipe=instance,
-                amount=new_ingredient['amount']
+                amount=amount
             )
-        instance.name = validated_data.pop('name')
-        instance.text = validated_data.pop('text')
-        if validated_data.get('image') is not None:
-            instance.image = validated_data.pop('image')
-        instance.cooking_time = validated_data.pop('cooking_time')
-        instance.save()
-        instance.tags.set(tags_data)
+            for ingredient_id, amount in amounts.items()
+            if ingredient_id not in records
+        ]
+        changes.update(
+            (record.ingredient_id, (record.amount, 1)) for record in added)
+        removed = records.keys() - amounts.keys()
+        if removed:
+            IngredientRecord.objects.filter(
+                recipe=instance, ingredient_id__in=removed).delete()
+        if changed:
+            IngredientRecord.objects.bulk_update(changed, ['amount'])
+        if added:
+            IngredientRecord.objects.bulk_create(added)
+        return changes
+
+    def update(self, instance, validated_data):
+        amounts = self._get_ingredient_amounts(
+            validated_data.pop('ingredients'))
+        tags_data = validated_data.pop('tags')
+        with transaction.atomic():
+            changes = self._update_ingredients(instance, amounts)
+            # Сохраняются только изменившиеся поля: поисковый вектор
+            # пересчитывается, лишь когда поменялись название или текст.
+            update_fields = ['updated_at']
+            for field in ('name', 'text', 'cooking_time'):
+                value = validated_data.pop(field)
+                if getattr(instance, field) != value:
+                    setattr(instance, field, value)
+                    update_fields.append(field)
+            image = validated_data.pop('image', None)
+            if image is not None:
+                instance.image = image
+                instance.image_renditions_ready = False
+                update_fields += ['image', 'image_renditions_ready']
+            instance.save(update_fields=update_fields)
+            self._set_tags(instance, tags_data)
+            if image is not None:
+                schedule_renditions(instance)
+            if changes:
+                ShopListIngredient.objects.change_recipe(instance.pk, changes)
         return instance
 
     def to_representation(self, instance):
@@ -1,9 +1,23 @@
-from django.http import HttpResponse
+import csv
+import json
+from collections import defaultdict
+from decimal import Decimal
+
+from django.conf import settings
+from django.db.models import F, Window
+from django.db.models.functions import RowNumber
+from django.http import StreamingHttpResponse
 from django.shortcuts import get_object_or_404
 from rest_framework import response, status
+from rest_framework.exceptions import ValidationError
 
+from ..feed import schedule_backfill, schedule_forget
 from ..models import Follow, Recipe, ShopList, User
+from ..similarity import similar_recipes_index
 from .serializers import RecipeFavoriteOrShopList, UserFollowSerializer
+from .viewer import get_viewer
+
+MAX_SIMILAR_RECIPES = 100
 
 
 def _get_recipe_in_shop_list_and_favorite(recipe, user, request, obj):
@@ -36,13 +50,16 @@ def _get_recipe_in_shop_list_and_favorite(recipe, user, request, obj):
 def _user_subscription_to_author(author, user, request, obj):
 
     serializer = UserFollowSerializer(
-        get_object_or_404(User, username=author.username))
+        get_object_or_404(User, username=author.username),
+        context={'request': request})
 
     if request.method == 'GET':
         follow, created = obj.objects.get_or_create(
             author=author, user=user
         )
         if created:
+            schedule_backfill(user.pk, author.pk)
+            get_viewer(request).record('follow', [author.pk])
             return response.Response(
                 serializer.data, status=status.HTTP_200_OK
             )
@@ -53,36 +70,136 @@ def _user_subscription_to_author(author, user, request, obj):
     elif request.method == 'DELETE':
         follow = get_object_or_404(Follow, author=author, user=user)
         follow.delete()
+        schedule_forget(user.pk, author.pk)
         return response.Response(
             "Успешная отписка", status=status.HTTP_204_NO_CONTENT)
 
 
-def _download_shop_list(user):
-    shop_list = list(user.shopping_list.values(
-        'recipe__ingredientrecord__ingredient__name',
-        'recipe__ingredientrecord__amount',
-        'recipe__ingredientrecord__ingredient__measurement_unit',
-    ))
-    print(shop_list)
-    wishlist = []
-    ingredients_list = {}
-    for data in shop_list:
-        name = data['recipe__ingredientrecord__ingredient__name']
-        amount = data['recipe__ingredientrecord__amount']
-        measurement_unit = data['recipe__ingredientrecord__ingredient__measurement_unit']
-        if name not in ingredients_list:
-            ingredients_list[name] = {
-                'measurement_unit': measurement_unit,
-                'amount': amount,
-            }
-        else:
-            ingredients_list[name]["amount"] += ingredients_list[name]['amount']
-
-    for name, data in ingredients_list.items():
-
-        wishlist.append(
-            f"{name} - {data['amount']} {data['measurement_unit']}\n"
+def _attach_latest_recipes(authors, limit):
+    authors = list(authors)
+    if not authors:
+        return authors
+    ranked = Recipe.objects.filter(
+        author_id__in=[author.id for author in authors]
+    ).only(
+        'id', 'author_id', 'name', 'image', 'image_renditions_ready',
+        'cooking_time'
+    ).annotate(
+        recipe_position=Window(
+            expression=RowNumber(),
+            partition_by=[F('author_id')],
+            order_by=F('id').desc(),
+        )
+    ).order_by()
+    sql, params = ranked.query.sql_with_params()
+    recipes = Recipe.objects.raw(
+        f'SELECT * FROM ({sql}) ranked '
+        f'WHERE recipe_position <= %s ORDER BY id DESC',
+        (*params, limit)
+    )
+    by_author = defaultdict(list)
+    for recipe in recipes:
+        by_author[recipe.author_id].append(recipe)
+    for author in authors:
+        author.latest_recipes = by_author[author.id]
+    return authors
+
+
+def _similar_recipes(recipe, request):
+    """Похожие рецепты в порядке убывания сходства."""
+    try:
+        limit = int(request.query_params.get('limit'))
+    except (TypeError, ValueError):
+        limit = settings.SIMILAR_RECIPES_LIMIT
+    limit = min(max(limit, 1), MAX_SIMILAR_RECIPES)
+    recipe_ids = similar_recipes_index.similar(recipe.pk, limit)
+    recipes = Recipe.objects.in_bulk(recipe_ids)
+    deleted = [pk for pk in recipe_ids if pk not in recipes]
+    if deleted:
+        similar_recipes_index.forget(deleted)
+    return [recipes[pk] for pk in recipe_ids if pk in recipes]
+
+
+def _pantry_ingredient_ids(request):
+    values = request.query_params.getlist('ingredients')
+    try:
+        ingredient_ids = {int(value) for value in values}
+    except ValueError:
+        raise ValidationError(
+            {'ingredients': 'id ингредиентов должны быть числами'})
+    if not ingredient_ids:
+        raise ValidationError(
+            {'ingredients': 'Укажите id ингредиентов, которые есть дома'})
+    return ingredient_ids
+
+
+class _Echo:
+
+    def write(self, value):
+        return value
+
+
+def _format_amount(amount):
+    return format(Decimal(str(round(amount, 6))).normalize(), 'f')
+
+
+def _shop_list_rows(rows):
+    for row in rows:
+        yield row['name'], row['total_amount'] or 0, row['measurement_unit']
+
+
+def _shop_list_as_txt(rows):
+    for name, amount, measurement_unit in _shop_list_rows(rows):
+        yield f"{name} - {_format_amount(amount)} {measurement_unit}\n"
+
+
+def _shop_list_as_csv(rows):
+    writer = csv.writer(_Echo())
+    yield writer.writerow(('name', 'amount', 'measurement_unit'))
+    for name, amount, measurement_unit in _shop_list_rows(rows):
+        yield writer.writerow(
+            (name, _format_amount(amount), measurement_unit))
+
+
+def _shop_list_as_json(rows):
+    yield '['
+    separator = ''
+    for name, amount, measurement_unit in _shop_list_rows(rows):
+        yield separator + json.dumps({
+            'name': name,
+            'amount': amount,
+            'measurement_unit': measurement_unit,
+        }, ensure_ascii=False)
+        separator = ','
+    yield ']'
+
+
+SHOP_LIST_FORMATS = {
+    'txt': (_shop_list_as_txt, 'text/plain; charset=utf-8'),
+    'csv': (_shop_list_as_csv, 'text/csv; charset=utf-8'),
+    'json': (_shop_list_as_json, 'application/json'),
+}
+
+
+def _aggregate_shop_list(user):
+    return user.shopping_list_ingredients.values(
+        name=F('ingredient__name'),
+        measurement_unit=F('ingredient__measurement_unit'),
+        total_amount=F('amount'),
+    ).order_by('name')
+
+
+def _download_shop_list(user, file_format='txt'):
+    if file_format not in SHOP_LIST_FORMATS:
+        return response.Response(
+            {"errors": f"Формат должен быть одним из: "
+                       f"{', '.join(SHOP_LIST_FORMATS)}"},
+            status=status.HTTP_400_BAD_REQUEST
         )
-    response = HttpResponse(wishlist, content_type='text/plain')
-    response['Content-Disposition'] = 'attachment; filename="ShoppingList.txt"'
-    return response
+    render, content_type = SHOP_LIST_FORMATS[file_format]
+    rows = _aggregate_shop_list(user).iterator()
+    shop_list = StreamingHttpResponse(render(rows), content_type=content_type)
+    shop_list['Content-Disposition'] = (
+        f'attachment; filename="ShoppingList.{file_format}"'
+    )
+    return shop_list
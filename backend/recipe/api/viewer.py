@@ -0,0 +1,97 @@
+from django.contrib.auth.models import AnonymousUser
+from django.db.models import CharField, F, Value
+
+from ..models import Favorite, Follow, ShopList
+
+RELATIONS = {
+    'follow': (Follow, 'author_id'),
+    'favorite': (Favorite, 'recipe_id'),
+    'cart': (ShopList, 'recipe_id'),
+}
+SET_LIMIT = 2000
+PROBE_BATCH = 500
+
+
+class ViewerContext:
+    """Подписки, избранное и список покупок пользователя запроса.
+
+    Списки вызывают prime() с id всех объектов страницы: все отношения
+    проверяются одним запросом UNION ALL из условий IN (...) не длиннее
+    PROBE_BATCH. Если флаг спрашивают без prime(), отношение загружается
+    целиком одним запросом, когда в нём не больше SET_LIMIT строк,
+    иначе проверяется только нужный id.
+    """
+
+    def __init__(self, user):
+        self.user = user
+        self._known = {}
+        self._complete = set()
+
+    def prime(self, **ids):
+        if self.user.is_anonymous:
+            return
+        probes = []
+        for kind, pks in ids.items():
+            if kind in self._complete:
+                continue
+            known = self._known.setdefault(kind, {})
+            missing = [pk for pk in dict.fromkeys(pks) if pk not in known]
+            known.update(dict.fromkeys(missing, False))
+            probes.extend(
+                self._probe(kind, missing[start:start + PROBE_BATCH])
+                for start in range(0, len(missing), PROBE_BATCH)
+            )
+        if probes:
+            for kind, pk in probes[0].union(*probes[1:], all=True):
+                self._known[kind][pk] = True
+
+    def has(self, kind, pk):
+        if self.user.is_anonymous:
+            return False
+        if kind not in self._known:
+            self._load(kind)
+        if pk not in self._known[kind] and kind not in self._complete:
+            self.prime(**{kind: [pk]})
+        return self._known[kind].get(pk, False)
+
+    def record(self, kind, ids, present=True):
+        """Учитывает связи, созданные или удалённые в этом запросе."""
+        self._known.setdefault(kind, {}).update(
+            (pk, present) for pk in ids)
+
+    def follows(self, author_id):
+        return author_id == self.user.pk or self.has('follow', author_id)
+
+    def favorited(self, recipe_id):
+        return self.has('favorite', recipe_id)
+
+    def in_cart(self, recipe_id):
+        return self.has('cart', recipe_id)
+
+    def _probe(self, kind, pks):
+        model, field = RELATIONS[kind]
+        return model.objects.filter(
+            user=self.user, **{f'{field}__in': pks}
+        ).annotate(
+            relation=Value(kind, output_field=CharField()),
+            related_id=F(field),
+        ).values_list('relation', 'related_id').order_by()
+
+    def _load(self, kind):
+        model, field = RELATIONS[kind]
+        found = list(model.objects.filter(user=self.user).values_list(
+            field, flat=True)[:SET_LIMIT + 1])
+        self._known[kind] = dict.fromkeys(found, True)
+        if len(found) <= SET_LIMIT:
+            self._complete.add(kind)
+
+
+def get_viewer(request):
+    """ViewerContext запроса, создаётся при первом обращении."""
+    if request is None:
+        return ViewerContext(AnonymousUser())
+    request = getattr(request, '_request', request)
+    viewer = getattr(request, '_viewer', None)
+    if viewer is None:
+        viewer = request._viewer = ViewerContext(request.user)
+    return viewer
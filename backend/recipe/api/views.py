@@ -1,65 +1,96 @@
-from django.db.models import Exists, OuterRef
+from django.db.models import Count, Exists, Max, OuterRef, Value
+from django.db.models.functions import Coalesce
+from django.http import HttpResponse
 from django_filters.rest_framework import DjangoFilterBackend
 from djoser.views import UserViewSet as BaseUserViewSet
-from rest_framework import generics, viewsets
+from rest_framework import generics, response, viewsets
 from rest_framework.decorators import action
 from rest_framework.filters import SearchFilter
-from rest_framework.permissions import AllowAny, IsAuthenticated
-
-from ..models import Favorite, Follow, Ingredient, Recipe, ShopList, Tag, User
-from .filters import IngredientNameFilter, RecipeFilter
+from rest_framework.permissions import (AllowAny, IsAdminUser,
+                                        IsAuthenticated)
+from rest_framework.views import APIView
+
+from ..feed import feed_recipes
+from ..metrics import metrics
+from ..models import (Favorite, Follow, Ingredient, IngredientRecord, Recipe,
+                      ShopList, Tag, User)
+from ..pantry import PantryMatches
+from ..versions import get_versions, user_key
+from .filters import (IngredientIndexFilterBackend, IngredientNameFilter,
+                      RecipeFilter)
+from .mixins import ConditionalGetMixin
 from .pagination import LimitPageNumberPagination
 from .permissions import IsAdminOrReadAnllyUser, IsAuthorRecipeOrReadOnly
 from .serializers import (CreateRecipeSerializer, IngredientSerializer,
-                          RecipeSerializer, TagSerializers,
-                          UserFollowSerializer)
-from .utilities import (_download_shop_list,
+                          PantryRecipeSerializer, RecipeSerializer,
+                          TagSerializers, UserFollowSerializer,
+                          get_recipes_limit)
+from .utilities import (_attach_latest_recipes, _download_shop_list,
                         _get_recipe_in_shop_list_and_favorite,
+                        _pantry_ingredient_ids, _similar_recipes,
                         _user_subscription_to_author)
+from .viewer import get_viewer
 
 
-class TagViewSet(viewsets.ReadOnlyModelViewSet):
+class TagViewSet(ConditionalGetMixin, viewsets.ReadOnlyModelViewSet):
     serializer_class = TagSerializers
     pagination_class = None
     queryset = Tag.objects.all()
     filter_backends = [DjangoFilterBackend, SearchFilter]
     permission_classes = [IsAdminOrReadAnllyUser]
+    cache_max_age = 300
+
+    def get_validators(self, request, *args, **kwargs):
+        return get_versions('tag'), None
 
 
-class IngredientViewSet(viewsets.ModelViewSet):
+class IngredientViewSet(ConditionalGetMixin, viewsets.ModelViewSet):
     serializer_class = IngredientSerializer
     queryset = Ingredient.objects.all()
     pagination_class = None
     permission_classes = (AllowAny,)
+    filter_backends = [IngredientIndexFilterBackend]
     filterset_class = IngredientNameFilter
+    cache_max_age = 300
 
+    def get_validators(self, request, *args, **kwargs):
+        return get_versions('ingredient'), None
 
-class RecipeViewSet(viewsets.ModelViewSet):
+
+class RecipeViewSet(ConditionalGetMixin, viewsets.ModelViewSet):
 
     permission_classes = [IsAuthorRecipeOrReadOnly]
     queryset = Recipe.objects.all()
     filter_backends = [DjangoFilterBackend]
     filterset_class = RecipeFilter
     pagination_class = LimitPageNumberPagination
+    cache_max_age = 10
+
+    def get_validators(self, request, *args, **kwargs):
+        versions = get_versions(
+            'tag', 'ingredient', 'user', user_key(request.user.pk))
+        if self.action == 'retrieve':
+            updated_at = Recipe.objects.filter(
+                pk=kwargs.get('pk')
+            ).values_list('updated_at', flat=True).first()
+            if updated_at is None:
+                return None, None
+            return (*versions, updated_at), updated_at
+        digest = self.filter_queryset(Recipe.objects.all()).aggregate(
+            updated_at=Max('updated_at'), count=Count('id'), last=Max('id'))
+        return (*versions, *digest.values()), None
 
     def get_queryset(self):
-        user = self.request.user
-        if user.is_anonymous:
-            return Recipe.objects.all()
-        queryset = Recipe.objects.annotate(
-            is_favorited=Exists(Favorite.objects.filter(
-                user=user, recipe_id=OuterRef('pk')
-            )),
-            is_in_shopping_cart=Exists(ShopList.objects.filter(
-                user=user, recipe_id=OuterRef('pk')
-            ))
-        )
-
-        return queryset
+        if self.action in ('update', 'partial_update'):
+            # Автор нужен для ответа после изменения.
+            return self.queryset.select_related('author')
+        return super().get_queryset()
 
     def get_serializer_class(self):
-        if self.action in ['list', 'retrieve']:
+        if self.action in ['list', 'retrieve', 'feed', 'similar']:
             return RecipeSerializer
+        if self.action == 'pantry':
+            return PantryRecipeSerializer
         return CreateRecipeSerializer
 
     def get_serializer_context(self):
@@ -92,9 +123,42 @@ class RecipeViewSet(viewsets.ModelViewSet):
         return _get_recipe_in_shop_list_and_favorite(
             recipe, user, request, Favorite)
 
+    @action(detail=False, permission_classes=[IsAuthenticated])
+    def feed(self, request):
+        queryset = self.filter_queryset(feed_recipes(request.user))
+        page = self.paginate_queryset(queryset)
+        serializer = self.get_serializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
+
+    @action(detail=True)
+    def similar(self, request, pk=None):
+        recipes = _similar_recipes(self.get_object(), request)
+        serializer = self.get_serializer(recipes, many=True)
+        return response.Response(serializer.data)
+
+    @action(detail=False)
+    def pantry(self, request):
+        ingredient_ids = _pantry_ingredient_ids(request)
+        recipe_ids = None
+        if any(value for name in RecipeFilter.base_filters
+               for value in request.query_params.getlist(name)):
+            # Маска нужна только с фильтрами и только для рецептов,
+            # в которых есть хотя бы один ингредиент из кладовой.
+            recipe_ids = set(self.filter_queryset(Recipe.objects.filter(
+                Exists(IngredientRecord.objects.filter(
+                    recipe_id=OuterRef('pk'),
+                    ingredient_id__in=ingredient_ids))
+            )).values_list('id', flat=True))
+        matches = PantryMatches(ingredient_ids, recipe_ids)
+        page = self.paginate_queryset(matches)
+        serializer = self.get_serializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
+
     @action(detail=False, permission_classes=[IsAuthenticated])
     def download_shopping_cart(self, request):
-        return _download_shop_list(request.user)
+        return _download_shop_list(
+            request.user, request.query_params.get('file_format', 'txt')
+        )
 
 
 class UserViewSet(BaseUserViewSet):
@@ -120,9 +184,37 @@ class UserFollowView(generics.ListAPIView):
     pagination_class = LimitPageNumberPagination
 
     def get_queryset(self):
-        return User.objects.filter(follower__user=self.request.user)
+        return User.objects.filter(
+            follower__user=self.request.user
+        ).annotate(
+            recipes_count=Coalesce('profile__recipes_count', Value(0)),
+        ).order_by('id')
+
+    def list(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+        page = self.paginate_queryset(queryset)
+        authors = _attach_latest_recipes(
+            queryset if page is None else page, get_recipes_limit(request)
+        )
+        get_viewer(request).record('follow', [author.pk for author in authors])
+        serializer = self.get_serializer(authors, many=True)
+        if page is None:
+            return response.Response(serializer.data)
+        return self.get_paginated_response(serializer.data)
 
     def get_serializer_context(self):
         context = super().get_serializer_context()
         context.update({'request': self.request})
         return context
+
+
+class MetricsView(APIView):
+
+    permission_classes = [IsAdminUser]
+    schema = None
+
+    def get(self, request):
+        return HttpResponse(
+            metrics.render(),
+            content_type='text/plain; version=0.0.4; charset=utf-8'
+        )
@@ -0,0 +1,62 @@
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import connections, transaction
+from django.db.models import Q
+
+from .models import FeedEntry, Follow, Recipe
+
+logger = logging.getLogger(__name__)
+
+_executor = ThreadPoolExecutor(
+    max_workers=max(settings.FEED_FANOUT_WORKERS, 1),
+    thread_name_prefix='feed-fanout',
+)
+
+
+def _run_in_worker(task, *args):
+    try:
+        getattr(FeedEntry.objects, task)(*args)
+    except Exception:
+        logger.exception('Не удалось обновить ленты: %s%s', task, args)
+    finally:
+        connections.close_all()
+
+
+def _schedule(task, *args):
+    """Выполняет метод FeedEntry.objects после коммита транзакции.
+
+    С одним потоком задачи выполняются в порядке постановки, поэтому
+    отписка не обгоняет заполнение ленты при подписке.
+    """
+    if settings.FEED_FANOUT_WORKERS <= 0:
+        transaction.on_commit(
+            lambda: getattr(FeedEntry.objects, task)(*args))
+        return
+    transaction.on_commit(
+        lambda: _executor.submit(_run_in_worker, task, *args))
+
+
+def schedule_fan_out(recipe):
+    _schedule('fan_out', recipe.pk, recipe.author_id)
+
+
+def schedule_backfill(user_id, author_id):
+    _schedule('backfill', user_id, author_id)
+
+
+def schedule_forget(user_id, author_id):
+    _schedule('forget', user_id, author_id)
+
+
+def feed_recipes(user):
+    """Рецепты ленты: записи ленты и рецепты авторов без раскладки."""
+    read_on_demand = Follow.objects.filter(
+        user=user,
+        author__profile__followers_count__gt=settings.FEED_FANOUT_LIMIT,
+    ).values('author_id')
+    return Recipe.objects.filter(
+        Q(pk__in=FeedEntry.objects.filter(user=user).values('recipe_id'))
+        | Q(author_id__in=read_on_demand)
+    ).order_by('-id')
@@ -0,0 +1,99 @@
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import connections, transaction
+from django.utils import timezone
+from PIL import Image, ImageOps
+
+from .models import Recipe
+
+logger = logging.getLogger(__name__)
+
+RENDITIONS = {
+    'thumbnail': (480, 480),
+    'medium': (1200, 1200),
+}
+FORMATS = {
+    'webp': ('WEBP', {'quality': 80, 'method': 4}),
+    'jpeg': ('JPEG', {'quality': 85, 'optimize': True, 'progressive': True}),
+}
+
+_executor = ThreadPoolExecutor(
+    max_workers=max(settings.IMAGE_RENDITION_WORKERS, 1),
+    thread_name_prefix='image-renditions',
+)
+
+
+def rendition_name(name, size, extension):
+    directory, filename = os.path.split(name)
+    stem, _ = os.path.splitext(filename)
+    return os.path.join(
+        directory, 'renditions', f'{stem}_{size}.{extension}')
+
+
+def rendition_names(name):
+    return {
+        size: {
+            extension: rendition_name(name, size, extension)
+            for extension in FORMATS
+        }
+        for size in RENDITIONS
+    }
+
+
+def image_storage():
+    return Recipe._meta.get_field('image').storage
+
+
+def generate_renditions(recipe_id, name, force=False):
+    targets = [
+        rendition_name(name, size, extension)
+        for size in RENDITIONS for extension in FORMATS
+    ]
+    if force or not all(map(image_storage().exists, targets)):
+        _render(name)
+    Recipe.objects.filter(pk=recipe_id, image=name).update(
+        image_renditions_ready=True, updated_at=timezone.now())
+
+
+def _render(name):
+    storage = image_storage()
+    with storage.open(name) as file:
+        image = Image.open(file)
+        image.load()
+    image = ImageOps.exif_transpose(image)
+    if image.mode not in ('RGB', 'RGBA'):
+        image = image.convert('RGBA' if 'A' in image.getbands() else 'RGB')
+    for size, box in RENDITIONS.items():
+        resized = image.copy()
+        resized.thumbnail(box, Image.LANCZOS)
+        for extension, (image_format, params) in FORMATS.items():
+            encoded = resized if image_format == 'WEBP' else (
+                resized.convert('RGB'))
+            buffer = BytesIO()
+            encoded.save(buffer, image_format, **params)
+            storage.replace(
+                rendition_name(name, size, extension),
+                ContentFile(buffer.getvalue()))
+
+
+def _generate_in_worker(recipe_id, name):
+    try:
+        generate_renditions(recipe_id, name)
+    except Exception:
+        logger.exception('Не удалось обработать изображение %s', name)
+    finally:
+        connections.close_all()
+
+
+def schedule_renditions(recipe):
+    recipe_id, name = recipe.pk, recipe.image.name
+    if settings.IMAGE_RENDITION_WORKERS <= 0:
+        transaction.on_commit(lambda: generate_renditions(recipe_id, name))
+        return
+    transaction.on_commit(
+        lambda: _executor.submit(_generate_in_worker, recipe_id, name))
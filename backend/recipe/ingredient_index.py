@@ -0,0 +1,74 @@
+import bisect
+import threading
+
+from django.conf import settings
+
+from .models import Ingredient
+from .versions import get_version
+
+UPPER_BOUND = chr(0x10FFFF)
+
+
+class IngredientPrefixIndex:
+    """Отсортированный индекс casefold-названий ингредиентов процесса.
+
+    Кроме начала названия индексируется начало каждого следующего слова:
+    совпадения по началу названия идут первыми, за ними — по началу слова.
+    Индекс перестраивается, когда меняется версия в кэше.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._version = None
+        self._index = ([], [], [])
+
+    def search(self, name, limit=None):
+        limit = limit or settings.INGREDIENT_SEARCH_LIMIT
+        self._ensure_fresh()
+        prefix = name.casefold()
+        ingredients, names, words = self._index
+        found = self._prefix_range(names, prefix, limit)
+        if len(found) < limit:
+            seen = set(found)
+            for position in self._prefix_range(words, prefix, limit * 2):
+                if position not in seen:
+                    seen.add(position)
+                    found.append(position)
+                    if len(found) == limit:
+                        break
+        return [ingredients[position] for position in found]
+
+    def _ensure_fresh(self):
+        version = get_version('ingredient')
+        if version == self._version:
+            return
+        with self._lock:
+            if version != self._version:
+                self._build()
+                self._version = version
+
+    def _build(self):
+        ingredients = list(Ingredient.objects.values(
+            'id', 'name', 'measurement_unit').order_by())
+        names, words = [], []
+        for position, ingredient in enumerate(ingredients):
+            name = ingredient['name'].casefold()
+            names.append((name, position))
+            for start in range(1, len(name)):
+                if name[start - 1] in ' -,(' and name[start] not in ' -,(':
+                    words.append((name[start:], position))
+        names.sort()
+        words.sort()
+        self._index = (ingredients, names, words)
+
+    @staticmethod
+    def _prefix_range(keys, prefix, limit):
+        start = bisect.bisect_left(keys, (prefix,))
+        stop = min(
+            bisect.bisect_left(keys, (prefix + UPPER_BOUND,), lo=start),
+            start + limit,
+        )
+        return [position for _, position in keys[start:stop]]
+
+
+ingredient_index = IngredientPrefixIndex()
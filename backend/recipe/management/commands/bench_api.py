@@ -0,0 +1,226 @@
+import base64
+import io
+import json
+import statistics
+import time
+from collections import namedtuple
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from PIL import Image
+from rest_framework.test import APIClient
+
+from recipe.models import (Favorite, Follow, Ingredient, Recipe, ShopList,
+                           Tag, User)
+
+Scenario = namedtuple(
+    'Scenario', 'name method url data setup anonymous',
+    defaults=(None, None, False))
+
+
+def _percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, round(fraction * (len(values) - 1)))]
+
+
+def _image_data():
+    content = io.BytesIO()
+    Image.new('RGB', (32, 32), (40, 160, 90)).save(content, 'PNG')
+    encoded = base64.b64encode(content.getvalue()).decode()
+    return f'data:image/png;base64,{encoded}'
+
+
+class Command(BaseCommand):
+    help = ('Измеряет задержку (p50/p99) и число запросов к базе для '
+            'эндпоинтов API и сравнивает их с сохранённым базовым замером. '
+            'Все изменения откатываются по окончании')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeat', type=int, default=50)
+        parser.add_argument('--warmup', type=int, default=3)
+        parser.add_argument(
+            '--user',
+            help='Имя пользователя, от которого идут запросы '
+                 '(по умолчанию — первый автор с непустым списком покупок)',
+        )
+        parser.add_argument(
+            '--baseline', help='JSON с базовым замером для сравнения')
+        parser.add_argument(
+            '--save-baseline', help='Сохранить замер в JSON-файл')
+        parser.add_argument(
+            '--tolerance', type=float, default=0.25,
+            help='Допустимый рост p50 относительно базового замера',
+        )
+
+    def handle(self, *args, **options):
+        user = self._get_user(options['user'])
+        clients = {False: APIClient(), True: APIClient()}
+        clients[False].force_authenticate(user)
+        results = {}
+        with transaction.atomic():
+            for scenario in self._scenarios(user):
+                results[scenario.name] = self._measure(
+                    clients[scenario.anonymous], scenario,
+                    options['repeat'], options['warmup'])
+            transaction.set_rollback(True)
+        baseline = self._load_baseline(options['baseline'])
+        regressions = self._report(results, baseline, options['tolerance'])
+        if options['save_baseline']:
+            with open(options['save_baseline'], 'w') as file:
+                json.dump(results, file, ensure_ascii=False, indent=2)
+        if regressions:
+            raise CommandError(
+                f'Ухудшение относительно базового замера: '
+                f'{", ".join(regressions)}')
+
+    @staticmethod
+    def _get_user(username):
+        if username:
+            return User.objects.get(username=username)
+        user = User.objects.filter(
+            pk__in=ShopList.objects.values('user_id')
+        ).filter(
+            pk__in=Recipe.objects.values('author_id')
+        ).order_by('id').first()
+        if user is None:
+            raise CommandError(
+                'Нет данных для замера, выполните manage.py seed_foodgram')
+        return user
+
+    @staticmethod
+    def _scenarios(user):
+        recipe = Recipe.objects.exclude(author=user).first()
+        own = Recipe.objects.filter(author=user).first()
+        author = recipe.author
+        tag = Tag.objects.first()
+        ingredient = Ingredient.objects.first()
+        image = _image_data()
+        ingredients = [{'id': ingredient.id, 'amount': 10}]
+
+        def relation(model, field, value, exists):
+            def setup():
+                rows = model.objects.filter(user=user, **{field: value})
+                if exists:
+                    rows.get_or_create(user=user, **{field: value})
+                else:
+                    rows.delete()
+            return setup
+
+        def new_recipe():
+            copy = Recipe.objects.create(
+                author=user, name='Замер', text='Замер', image=own.image,
+                cooking_time=1)
+            return f'/api/recipes/{copy.id}/'
+
+        return [
+            Scenario('tags.list', 'get', '/api/tags/'),
+            Scenario('tags.retrieve', 'get', f'/api/tags/{tag.id}/'),
+            Scenario('ingredients.list', 'get', '/api/ingredients/'),
+            Scenario('ingredients.search', 'get',
+                     f'/api/ingredients/?name={ingredient.name[:2]}'),
+            Scenario('ingredients.retrieve', 'get',
+                     f'/api/ingredients/{ingredient.id}/'),
+            Scenario('recipes.list anonymous', 'get', '/api/recipes/',
+                     anonymous=True),
+            Scenario('recipes.list', 'get', '/api/recipes/'),
+            Scenario('recipes.list filtered', 'get',
+                     f'/api/recipes/?tags={tag.slug}&is_favorited=1'),
+            Scenario('recipes.list search', 'get',
+                     f'/api/recipes/?search={recipe.name.split()[0]}'),
+            Scenario('recipes.list cursor', 'get',
+                     '/api/recipes/?cursor=&limit=20'),
+            Scenario('recipes.retrieve', 'get',
+                     f'/api/recipes/{recipe.id}/'),
+            Scenario('recipes.create', 'post', '/api/recipes/', {
+                'name': 'Замер', 'text': 'Замер', 'cooking_time': 5,
+                'image': image, 'tags': [tag.id],
+                'ingredients': ingredients,
+            }),
+            Scenario('recipes.partial_update', 'patch',
+                     f'/api/recipes/{own.id}/', {
+                         'name': 'Замер', 'text': 'Замер',
+                         'cooking_time': 5, 'tags': [tag.id],
+                         'ingredients': ingredients,
+                     }),
+            Scenario('recipes.destroy', 'delete', new_recipe),
+            Scenario('recipes.favorite add', 'get',
+                     f'/api/recipes/{recipe.id}/favorite/',
+                     setup=relation(Favorite, 'recipe', recipe, False)),
+            Scenario('recipes.favorite delete', 'delete',
+                     f'/api/recipes/{recipe.id}/favorite/',
+                     setup=relation(Favorite, 'recipe', recipe, True)),
+            Scenario('recipes.shopping_cart add', 'get',
+                     f'/api/recipes/{recipe.id}/shopping_cart/',
+                     setup=relation(ShopList, 'recipe', recipe, False)),
+            Scenario('recipes.shopping_cart delete', 'delete',
+                     f'/api/recipes/{recipe.id}/shopping_cart/',
+                     setup=relation(ShopList, 'recipe', recipe, True)),
+            Scenario('recipes.download_shopping_cart', 'get',
+                     '/api/recipes/download_shopping_cart/'),
+            Scenario('users.list', 'get', '/api/users/'),
+            Scenario('users.retrieve', 'get', f'/api/users/{author.id}/'),
+            Scenario('users.me', 'get', '/api/users/me/'),
+            Scenario('users.subscribe add', 'get',
+                     f'/api/users/{author.id}/subscribe/',
+                     setup=relation(Follow, 'author', author, False)),
+            Scenario('users.subscribe delete', 'delete',
+                     f'/api/users/{author.id}/subscribe/',
+                     setup=relation(Follow, 'author', author, True)),
+            Scenario('users.subscriptions', 'get',
+                     '/api/users/subscriptions/'),
+        ]
+
+    def _measure(self, client, scenario, repeat, warmup):
+        timings, queries = [], []
+        for iteration in range(warmup + repeat):
+            url = scenario.url
+            if scenario.setup:
+                scenario.setup()
+            if callable(url):
+                url = url()
+            with CaptureQueriesContext(connection) as context:
+                start = time.perf_counter()
+                response = getattr(client, scenario.method)(
+                    url, scenario.data, format='json')
+                if response.streaming:
+                    b''.join(response.streaming_content)
+                elapsed = time.perf_counter() - start
+            if response.status_code >= 400:
+                raise CommandError(
+                    f'{scenario.name}: {scenario.method.upper()} {url} '
+                    f'вернул {response.status_code}')
+            if iteration >= warmup:
+                timings.append(elapsed * 1000)
+                queries.append(len(context.captured_queries))
+        return {
+            'p50': round(statistics.median(timings), 3),
+            'p99': round(_percentile(timings, 0.99), 3),
+            'queries': max(queries),
+        }
+
+    @staticmethod
+    def _load_baseline(path):
+        if not path:
+            return {}
+        with open(path) as file:
+            return json.load(file)
+
+    def _report(self, results, baseline, tolerance):
+        regressions = []
+        self.stdout.write(
+            f'{"эндпоинт":<34}{"p50, мс":>10}{"p99, мс":>10}{"запросы":>9}')
+        for name, result in results.items():
+            line = (f'{name:<34}{result["p50"]:>10.2f}'
+                    f'{result["p99"]:>10.2f}{result["queries"]:>9}')
+            previous = baseline.get(name)
+            if previous:
+                change = result['p50'] / previous['p50'] - 1
+                line += (f'  p50 {change:+.0%}, запросы '
+                         f'{previous["queries"]} -> {result["queries"]}')
+                if (result['queries'] > previous['queries']
+                        or change > tolerance):
+                    regressions.append(name)
+                    line = self.style.ERROR(line)
+            self.stdout.write(line)
+        return regressions
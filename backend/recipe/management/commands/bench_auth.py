@@ -0,0 +1,123 @@
+import statistics
+import time
+from importlib import import_module
+
+from django.conf import settings
+from django.contrib.auth import (BACKEND_SESSION_KEY, HASH_SESSION_KEY,
+                                 SESSION_KEY)
+from django.contrib.auth.middleware import AuthenticationMiddleware
+from django.contrib.sessions.middleware import SessionMiddleware
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext, override_settings
+from rest_framework.authentication import (SessionAuthentication,
+                                           TokenAuthentication)
+from rest_framework.authtoken.models import Token
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.tokens import AccessToken
+
+from recipe.api.authentication import (CachedJWTAuthentication,
+                                       CachedModelBackend,
+                                       CachedTokenAuthentication, auth_cache)
+from recipe.models import User
+
+MODEL_BACKEND = 'django.contrib.auth.backends.ModelBackend'
+CACHED_BACKEND = (
+    f'{CachedModelBackend.__module__}.{CachedModelBackend.__name__}')
+
+
+class Command(BaseCommand):
+    help = ('Сравнивает время и число запросов к базе на аутентификацию '
+            'запроса по токену, JWT и сессии без кэша и с AuthCache. '
+            'Созданные токен и сессии удаляются по окончании')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeat', type=int, default=500)
+        parser.add_argument(
+            '--user', help='Имя пользователя (по умолчанию — первый '
+                           'активный)')
+
+    def handle(self, *args, **options):
+        if not auth_cache.ttl:
+            raise CommandError('Кэш отключён: AUTH_CACHE_TTL=0')
+        user = self._get_user(options['user'])
+        factory = APIRequestFactory()
+        self.stdout.write(
+            f'{"способ":<10}{"без кэша, мкс":>16}{"запросы":>9}'
+            f'{"с кэшем, мкс":>15}{"запросы":>9}')
+        with transaction.atomic():
+            token = Token.objects.get_or_create(user=user)[0].key
+            header = {'HTTP_AUTHORIZATION': f'Token {token}'}
+            jwt = {
+                'HTTP_AUTHORIZATION': f'Token {AccessToken.for_user(user)}'}
+            cases = (
+                ('token', TokenAuthentication(), CachedTokenAuthentication(),
+                 lambda: factory.get('/', **header)),
+                ('jwt', JWTAuthentication(), CachedJWTAuthentication(),
+                 lambda: factory.get('/', **jwt)),
+            )
+            for name, plain, cached, build in cases:
+                self._row(
+                    name,
+                    self._measure(plain.authenticate, build, options),
+                    self._measure(cached.authenticate, build, options))
+            self._row(
+                'session',
+                self._measure_session(user, MODEL_BACKEND, factory, options),
+                self._measure_session(user, CACHED_BACKEND, factory,
+                                      options))
+            transaction.set_rollback(True)
+        auth_cache.clear()
+
+    @staticmethod
+    def _get_user(username):
+        users = User.objects.filter(is_active=True)
+        if username:
+            users = users.filter(username=username)
+        user = users.order_by('id').first()
+        if user is None:
+            raise CommandError('Не найден активный пользователь')
+        return user
+
+    def _measure(self, authenticate, build, options):
+        auth_cache.clear()
+        authenticate(Request(build()))
+        timings, queries = [], 0
+        for _ in range(options['repeat']):
+            request = Request(build())
+            with CaptureQueriesContext(connection) as context:
+                start = time.perf_counter()
+                authenticate(request)
+                timings.append(time.perf_counter() - start)
+            queries = max(queries, len(context.captured_queries))
+        return statistics.median(timings) * 1e6, queries
+
+    def _measure_session(self, user, backend, factory, options):
+        session = import_module(settings.SESSION_ENGINE).SessionStore()
+        session[SESSION_KEY] = str(user.pk)
+        session[BACKEND_SESSION_KEY] = backend
+        session[HASH_SESSION_KEY] = user.get_session_auth_hash()
+        session.save()
+        sessions = SessionMiddleware(lambda request: None)
+        users = AuthenticationMiddleware(lambda request: None)
+
+        def build():
+            request = factory.get('/')
+            request.COOKIES[settings.SESSION_COOKIE_NAME] = (
+                session.session_key)
+            sessions.process_request(request)
+            users.process_request(request)
+            return request
+
+        with override_settings(AUTHENTICATION_BACKENDS=[backend]):
+            result = self._measure(
+                SessionAuthentication().authenticate, build, options)
+        session.delete()
+        return result
+
+    def _row(self, name, plain, cached):
+        self.stdout.write(
+            f'{name:<10}{plain[0]:>16.1f}{plain[1]:>9}'
+            f'{cached[0]:>15.1f}{cached[1]:>9}')
@@ -0,0 +1,69 @@
+import statistics
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.db.utils import load_backend
+from rest_framework.test import APIClient
+
+from .bench_api import _percentile
+
+ENGINES = (
+    ('без пула', 'django.db.backends.postgresql'),
+    ('пул', 'foodgram.db'),
+)
+
+
+class Command(BaseCommand):
+    help = ('Сравнивает время подключения к базе и задержку запроса к API, '
+            'когда каждый запрос открывает новое соединение и когда '
+            'соединение берётся из пула')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', default='/api/tags/')
+        parser.add_argument('--repeat', type=int, default=200)
+        parser.add_argument('--warmup', type=int, default=5)
+
+    def handle(self, *args, **options):
+        original = connections[DEFAULT_DB_ALIAS]
+        if original.vendor != 'postgresql':
+            raise CommandError('Замер выполняется только для PostgreSQL')
+        settings_dict = original.settings_dict
+        client = APIClient()
+        self.stdout.write(
+            f'{"режим":<12}{"подключение p50, мс":>22}'
+            f'{"запрос p50, мс":>17}{"запрос p99, мс":>17}')
+        try:
+            for label, engine in ENGINES:
+                wrapper = load_backend(engine).DatabaseWrapper(
+                    {**settings_dict, 'ENGINE': engine, 'CONN_MAX_AGE': 0},
+                    DEFAULT_DB_ALIAS)
+                connections[DEFAULT_DB_ALIAS] = wrapper
+                connect, request = self._measure(wrapper, client, options)
+                wrapper.close()
+                self.stdout.write(
+                    f'{label:<12}{statistics.median(connect):>22.2f}'
+                    f'{statistics.median(request):>17.2f}'
+                    f'{_percentile(request, 0.99):>17.2f}')
+        finally:
+            connections[DEFAULT_DB_ALIAS] = original
+
+    def _measure(self, wrapper, client, options):
+        """Каждая итерация начинается с закрытого соединения, как запрос."""
+        connect, request = [], []
+        for iteration in range(options['warmup'] + options['repeat']):
+            wrapper.close()
+            start = time.perf_counter()
+            wrapper.ensure_connection()
+            connected = time.perf_counter()
+            wrapper.close()
+            requested = time.perf_counter()
+            response = client.get(options['url'])
+            finished = time.perf_counter()
+            if response.status_code >= 400:
+                raise CommandError(
+                    f'{options["url"]} вернул {response.status_code}')
+            if iteration >= options['warmup']:
+                connect.append((connected - start) * 1000)
+                request.append((finished - requested) * 1000)
+        return connect, request
@@ -0,0 +1,44 @@
+import timeit
+
+from django.core.management.base import BaseCommand
+
+from recipe.api.filters import IngredientNameFilter
+from recipe.api.serializers import IngredientSerializer
+from recipe.ingredient_index import ingredient_index
+from recipe.models import Ingredient
+
+
+class Command(BaseCommand):
+    help = ('Сравнивает поиск ингредиентов по началу названия '
+            'через индекс в памяти и через ORM')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'prefixes', nargs='*', default=['а', 'мо', 'сыр', 'помид'],
+            help='Префиксы для поиска',
+        )
+        parser.add_argument('--repeat', type=int, default=200)
+
+    def handle(self, *args, **options):
+        repeat = options['repeat']
+        ingredient_index.search('')
+        self.stdout.write(
+            f'Ингредиентов: {Ingredient.objects.count()}, '
+            f'повторов: {repeat}'
+        )
+        for prefix in options['prefixes']:
+            index_time = timeit.timeit(
+                lambda: ingredient_index.search(prefix), number=repeat)
+            orm_time = timeit.timeit(
+                lambda: self._orm_search(prefix), number=repeat)
+            self.stdout.write(
+                f'{prefix!r}: индекс {index_time / repeat * 1e6:.1f} мкс, '
+                f'ORM {orm_time / repeat * 1e6:.1f} мкс, '
+                f'x{orm_time / index_time:.1f}'
+            )
+
+    @staticmethod
+    def _orm_search(prefix):
+        queryset = IngredientNameFilter(
+            {'name': prefix}, queryset=Ingredient.objects.all()).qs
+        return IngredientSerializer(queryset, many=True).data
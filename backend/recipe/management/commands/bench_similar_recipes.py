@@ -0,0 +1,94 @@
+import random
+import time
+from itertools import accumulate
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Count
+
+from recipe.models import IngredientRecord, Recipe
+from recipe.similarity import SimilarRecipesIndex
+
+from .bench_api import _percentile
+
+
+class Command(BaseCommand):
+    help = ('Замеряет поиск похожих рецептов по матрице в памяти. С '
+            '--recipes строит синтетическую матрицу нужного размера, без '
+            'него берёт рецепты из базы и сравнивает с самосоединением '
+            'IngredientRecord через ORM')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--recipes', type=int, default=0,
+            help='Размер синтетической матрицы, например 100000',
+        )
+        parser.add_argument('--ingredients', type=int, default=2000)
+        parser.add_argument('--ingredients-per-recipe', type=int, default=8)
+        parser.add_argument('--tags', type=int, default=6)
+        parser.add_argument('--limit', type=int, default=10)
+        parser.add_argument('--repeat', type=int, default=200)
+        parser.add_argument('--warmup', type=int, default=50)
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        self.random = random.Random(options['seed'])
+        index = SimilarRecipesIndex()
+        start = time.perf_counter()
+        if options['recipes']:
+            index.replace(*self._synthetic(options))
+        else:
+            index.build()
+        self.stdout.write(
+            f'Рецептов: {len(index)}, построение '
+            f'{time.perf_counter() - start:.2f} с')
+        recipe_ids = list(index)
+        if not recipe_ids:
+            raise CommandError('Нет рецептов для замера')
+        sample = self.random.choices(recipe_ids, k=options['repeat'])
+        limit = options['limit']
+        for recipe_id in self.random.choices(
+                recipe_ids, k=options['warmup']):
+            index.rank(recipe_id, limit)
+        self._report(
+            'индекс', [lambda pk=pk: index.rank(pk, limit) for pk in sample])
+        if not options['recipes']:
+            self._report('ORM', [
+                lambda pk=pk: self._orm_similar(pk, limit) for pk in sample])
+
+    def _synthetic(self, options):
+        """Популярность ингредиентов убывает как 1/ранг, как в жизни."""
+        ingredients = range(1, options['ingredients'] + 1)
+        weights = list(accumulate(1 / rank for rank in ingredients))
+        per_recipe = min(options['ingredients_per_recipe'], len(ingredients))
+        tags = range(1, options['tags'] + 1)
+        rows, tag_rows = {}, {}
+        for recipe_id in range(1, options['recipes'] + 1):
+            chosen = set()
+            while len(chosen) < per_recipe:
+                chosen.update(self.random.choices(
+                    ingredients, cum_weights=weights,
+                    k=per_recipe - len(chosen)))
+            rows[recipe_id] = frozenset(chosen)
+            tag_rows[recipe_id] = frozenset(
+                self.random.sample(tags, min(len(tags), 2)))
+        return rows, tag_rows
+
+    @staticmethod
+    def _orm_similar(recipe_id, limit):
+        ingredients = IngredientRecord.objects.filter(
+            recipe_id=recipe_id).values('ingredient_id')
+        return list(Recipe.objects.filter(
+            ingredientrecord__ingredient_id__in=ingredients,
+        ).exclude(pk=recipe_id).annotate(
+            shared=Count('ingredientrecord'),
+        ).order_by('-shared', '-id').values_list('id', flat=True)[:limit])
+
+    def _report(self, label, calls):
+        timings = []
+        for call in calls:
+            start = time.perf_counter()
+            call()
+            timings.append((time.perf_counter() - start) * 1000)
+        self.stdout.write(
+            f'{label}: p50 {_percentile(timings, 0.5):.2f} мс, '
+            f'p99 {_percentile(timings, 0.99):.2f} мс')
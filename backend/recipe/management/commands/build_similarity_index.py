@@ -0,0 +1,27 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from recipe.similarity import SimilarRecipesIndex
+
+
+class Command(BaseCommand):
+    help = ('Строит матрицу «рецепт × ингредиент» для похожих рецептов и '
+            'сохраняет снимок в SIMILARITY_INDEX_PATH. Процессы загружают '
+            'снимок при первом запросе и дочитывают изменённые рецепты')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--path', default=settings.SIMILARITY_INDEX_PATH,
+            help='Куда сохранить снимок',
+        )
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        index = SimilarRecipesIndex()
+        index.build()
+        index.save(options['path'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Рецептов в индексе: {len(index)}, '
+            f'{time.perf_counter() - start:.1f} с'))
@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from recipe.query_plans import (SEQUENTIAL_SCAN, disable_sequential_scans,
+                                hot_queries, sequential_scans)
+
+
+class Command(BaseCommand):
+    help = ('Выводит планы выполнения частых запросов и завершается '
+            'с ошибкой, если какой-то из них читает таблицу целиком')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--verbose-plans', action='store_true')
+
+    def handle(self, *args, **options):
+        if connection.vendor not in SEQUENTIAL_SCAN:
+            raise CommandError(
+                f'Проверка планов не поддерживается для {connection.vendor}')
+        failures = []
+        with transaction.atomic():
+            disable_sequential_scans()
+            for name, queryset in hot_queries(1, 1, 'slug').items():
+                plan, scans = sequential_scans(queryset)
+                if options['verbose_plans'] or scans:
+                    self.stdout.write(f'{name}:\n{plan}\n')
+                if scans:
+                    failures.append(f'{name}: {", ".join(scans)}')
+                else:
+                    self.stdout.write(f'{name}: OK')
+        if failures:
+            raise CommandError(
+                'Последовательное чтение таблиц:\n' + '\n'.join(failures))
+        self.stdout.write(self.style.SUCCESS('Все запросы используют индексы'))
@@ -0,0 +1,70 @@
+import os
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from recipe.models import Recipe
+
+RENDITIONS_DIR = 'renditions'
+
+
+class Command(BaseCommand):
+    help = ('Удаляет изображения рецептов и их уменьшенные копии, '
+            'на которые не ссылается ни один рецепт')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Только показать файлы, которые будут удалены',
+        )
+        parser.add_argument(
+            '--min-age', type=int, default=60,
+            help='Не трогать файлы моложе указанного числа минут',
+        )
+
+    def handle(self, *args, **options):
+        field = Recipe._meta.get_field('image')
+        storage = field.storage
+        referenced = set(
+            Recipe.objects.exclude(image='').values_list('image', flat=True))
+        referenced_stems = {
+            (os.path.dirname(name), os.path.splitext(
+                os.path.basename(name))[0])
+            for name in referenced
+        }
+        threshold = timezone.now() - timedelta(minutes=options['min_age'])
+        removed = kept = 0
+        for name in self._walk(storage, field.upload_to.rstrip('/')):
+            if self._is_referenced(name, referenced, referenced_stems):
+                kept += 1
+                continue
+            if storage.get_modified_time(name) > threshold:
+                kept += 1
+                continue
+            removed += 1
+            self.stdout.write(f'Удаление: {name}')
+            if not options['dry_run']:
+                storage.delete(name)
+        self.stdout.write(self.style.SUCCESS(
+            f'Удалено: {removed}, оставлено: {kept}'))
+
+    def _walk(self, storage, directory):
+        if not storage.exists(directory):
+            return
+        directories, files = storage.listdir(directory)
+        for file in files:
+            yield f'{directory}/{file}'
+        for child in directories:
+            yield from self._walk(storage, f'{directory}/{child}')
+
+    @staticmethod
+    def _is_referenced(name, referenced, referenced_stems):
+        if name in referenced:
+            return True
+        directory, filename = os.path.split(name)
+        if os.path.basename(directory) != RENDITIONS_DIR:
+            return False
+        stem = os.path.splitext(filename)[0].rsplit('_', 1)[0]
+        return (os.path.dirname(directory), stem) in referenced_stems
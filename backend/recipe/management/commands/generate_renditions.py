@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand
+
+from recipe.images import generate_renditions
+from recipe.models import Recipe
+
+
+class Command(BaseCommand):
+    help = 'Создаёт уменьшенные копии изображений рецептов'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--all',
+            action='store_true',
+            help='Пересоздать копии и для уже обработанных рецептов',
+        )
+
+    def handle(self, *args, **options):
+        recipes = Recipe.objects.exclude(image='')
+        if not options['all']:
+            recipes = recipes.filter(image_renditions_ready=False)
+        done = failed = 0
+        for recipe_id, name in recipes.values_list('id', 'image').iterator():
+            try:
+                generate_renditions(recipe_id, name, force=options['all'])
+            except (OSError, ValueError) as error:
+                failed += 1
+                self.stderr.write(f'{name}: {error}')
+            else:
+                done += 1
+        self.stdout.write(self.style.SUCCESS(
+            f'Обработано: {done}, с ошибками: {failed}'))
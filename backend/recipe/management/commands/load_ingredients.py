@@ -0,0 +1,123 @@
+import csv
+import json
+from itertools import islice
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from recipe.models import Ingredient
+from recipe.versions import bump
+
+NAME_KEYS = ('name', 'title')
+UNIT_KEYS = ('measurement_unit', 'dimension')
+CHUNK_SIZE = 64 * 1024
+
+
+def _iter_csv(file):
+    for row in csv.reader(file):
+        if len(row) >= 2:
+            yield {'name': row[0], 'measurement_unit': row[1]}
+
+
+def _iter_json(file):
+    decoder = json.JSONDecoder()
+    buffer, position, eof = '', 0, False
+    while True:
+        while position < len(buffer) and buffer[position] in ' \t\r\n,[]':
+            position += 1
+        try:
+            item, position = decoder.raw_decode(buffer, position)
+        except json.JSONDecodeError:
+            if eof:
+                if buffer[position:].strip():
+                    raise
+                return
+            chunk = file.read(CHUNK_SIZE)
+            eof = not chunk
+            buffer, position = buffer[position:] + chunk, 0
+            continue
+        yield item
+
+
+def _normalize(item):
+    if 'model' in item:
+        if item['model'] != 'recipe.ingredient':
+            return None
+        item = item.get('fields', {})
+    name = next((item[key] for key in NAME_KEYS if key in item), None)
+    unit = next((item[key] for key in UNIT_KEYS if key in item), None)
+    if not name or not unit:
+        return None
+    return name.strip(), unit.strip()
+
+
+class Command(BaseCommand):
+    help = 'Загружает ингредиенты из CSV или JSON файла'
+
+    readers = {'csv': _iter_csv, 'json': _iter_json}
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Путь к файлу с ингредиентами')
+        parser.add_argument(
+            '--format', choices=list(self.readers),
+            help='Формат файла, по умолчанию определяется по расширению',
+        )
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        path = Path(options['path'])
+        file_format = options['format'] or path.suffix.lstrip('.').lower()
+        if file_format not in self.readers:
+            raise CommandError(f'Неизвестный формат файла: {path}')
+        if not path.is_file():
+            raise CommandError(f'Файл не найден: {path}')
+        totals = {'inserted': 0, 'updated': 0, 'skipped': 0}
+        with path.open(encoding='utf-8') as file:
+            rows = map(_normalize, self.readers[file_format](file))
+            while True:
+                batch = list(islice(rows, options['batch_size']))
+                if not batch:
+                    break
+                for key, value in self._load_batch(batch).items():
+                    totals[key] += value
+        if totals['inserted'] or totals['updated']:
+            bump('ingredient')
+        self.stdout.write(self.style.SUCCESS(
+            'Добавлено: {inserted}, обновлено: {updated}, '
+            'пропущено: {skipped}'.format(**totals)
+        ))
+
+    @staticmethod
+    def _load_batch(batch):
+        units = {}
+        skipped = 0
+        for row in batch:
+            if row is None or row[0] in units:
+                skipped += 1
+                continue
+            units[row[0]] = row[1]
+        with transaction.atomic():
+            existing = {
+                ingredient.name: ingredient
+                for ingredient in Ingredient.objects.filter(name__in=units)
+            }
+            changed = []
+            for name, ingredient in existing.items():
+                if ingredient.measurement_unit == units[name]:
+                    skipped += 1
+                else:
+                    ingredient.measurement_unit = units[name]
+                    changed.append(ingredient)
+            Ingredient.objects.bulk_update(changed, ['measurement_unit'])
+            new = [Ingredient(name=name, measurement_unit=unit)
+                   for name, unit in units.items() if name not in existing]
+            # Имена уже проверены по базе выше, поэтому вставленные
+            # считаются по пачке без подсчёта строк таблицы;
+            # ignore_conflicts защищает лишь от параллельной загрузки.
+            Ingredient.objects.bulk_create(new, ignore_conflicts=True)
+        return {
+            'inserted': len(new),
+            'updated': len(changed),
+            'skipped': skipped,
+        }
@@ -0,0 +1,44 @@
+from django.core.files import File
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from recipe.models import Recipe
+from recipe.storage import is_content_addressed
+
+
+class Command(BaseCommand):
+    help = ('Переносит существующие изображения рецептов в хранилище '
+            'с именами по хешу содержимого')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Только показать, какие файлы будут перенесены',
+        )
+
+    def handle(self, *args, **options):
+        storage = Recipe._meta.get_field('image').storage
+        moved = missing = 0
+        recipes = Recipe.objects.exclude(image='').values_list('id', 'image')
+        for recipe_id, name in recipes.iterator():
+            if is_content_addressed(name):
+                continue
+            if not storage.exists(name):
+                missing += 1
+                self.stderr.write(f'Файл не найден: {name}')
+                continue
+            moved += 1
+            with storage.open(name) as file:
+                file = File(file, name=name)
+                if options['dry_run']:
+                    new_name = storage.content_name(name, file)
+                else:
+                    new_name = storage.save(name, file)
+                    Recipe.objects.filter(pk=recipe_id, image=name).update(
+                        image=new_name, image_renditions_ready=False,
+                        updated_at=timezone.now())
+            self.stdout.write(f'{name} -> {new_name}')
+        self.stdout.write(self.style.SUCCESS(
+            f'Перенесено: {moved}, не найдено: {missing}. Старые файлы '
+            f'удаляет команда gc_media, копии — generate_renditions'))
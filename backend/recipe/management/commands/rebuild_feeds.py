@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from recipe.models import FeedEntry
+
+
+class Command(BaseCommand):
+    help = ('Пересобирает ленты подписок по текущим подпискам, например '
+            'после изменения FEED_LENGTH или FEED_FANOUT_LIMIT')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--user', type=int, action='append', dest='users',
+            help='id пользователя, чью ленту пересобрать (можно повторять)',
+        )
+
+    def handle(self, *args, **options):
+        FeedEntry.objects.rebuild(options['users'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Записей в лентах: {FeedEntry.objects.count()}'))
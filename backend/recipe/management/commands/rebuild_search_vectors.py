@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand
+
+from recipe.models import Recipe
+from recipe.search import update_search_vectors, uses_postgres
+from recipe.versions import bump
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает поисковые векторы рецептов'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--missing',
+            action='store_true',
+            help='Только для рецептов, у которых вектора ещё нет',
+        )
+
+    def handle(self, *args, **options):
+        bump('recipe_search')
+        if not uses_postgres():
+            self.stdout.write(
+                'База не PostgreSQL: поиск использует индекс в памяти, '
+                'он будет перестроен при следующем запросе')
+            return
+        recipes = Recipe.objects.all()
+        if options['missing']:
+            recipes = recipes.filter(search_vector__isnull=True)
+        updated = update_search_vectors(recipes)
+        self.stdout.write(self.style.SUCCESS(
+            f'Обновлено поисковых векторов: {updated}'))
@@ -0,0 +1,54 @@
+import math
+
+from django.core.management.base import BaseCommand, CommandError
+
+from recipe.models import ShopListIngredient
+
+
+class Command(BaseCommand):
+    help = ('Пересчитывает агрегированные списки покупок и сверяет их '
+            'с рецептами в корзинах пользователей')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check-only',
+            action='store_true',
+            help='Только сверить таблицу, не пересчитывая её',
+        )
+
+    def handle(self, *args, **options):
+        if not options['check_only']:
+            ShopListIngredient.objects.rebuild()
+            self.stdout.write('Списки покупок пересчитаны')
+        mismatches = self._find_mismatches()
+        for key, stored, live in mismatches:
+            self.stderr.write(
+                f'user={key[0]} ingredient={key[1]}: '
+                f'в таблице {stored}, по рецептам {live}'
+            )
+        if mismatches:
+            raise CommandError(f'Найдено расхождений: {len(mismatches)}')
+        self.stdout.write(self.style.SUCCESS('Расхождений не найдено'))
+
+    @staticmethod
+    def _find_mismatches():
+        live = {
+            (row['user_id'], row['ingredient_id']):
+                (row['total_amount'], row['records_count'])
+            for row in ShopListIngredient.objects.live_totals().iterator()
+        }
+        stored = {
+            (user_id, ingredient_id): (amount, records)
+            for user_id, ingredient_id, amount, records
+            in ShopListIngredient.objects.values_list(
+                'user_id', 'ingredient_id', 'amount', 'records'
+            ).iterator()
+        }
+        mismatches = []
+        for key in live.keys() | stored.keys():
+            expected, actual = live.get(key), stored.get(key)
+            if (expected is None or actual is None
+                    or expected[1] != actual[1]
+                    or not math.isclose(expected[0], actual[0])):
+                mismatches.append((key, actual, expected))
+        return mismatches
@@ -0,0 +1,58 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Count, F, OuterRef, Q, Subquery, Value
+from django.db.models.functions import Coalesce
+
+from recipe.models import Favorite, Profile, Recipe, ShopList, User
+
+
+def _count_of(model, field):
+    return Coalesce(Subquery(
+        model.objects.filter(
+            **{field: OuterRef('pk')}
+        ).order_by().values(field).annotate(
+            count=Count('id')).values('count')
+    ), Value(0))
+
+
+class Command(BaseCommand):
+    help = ('Пересчитывает счётчики избранного, списков покупок, рецептов '
+            'и подписчиков и исправляет расхождения')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Только показать количество расхождений',
+        )
+
+    def handle(self, *args, **options):
+        recipes = Recipe.objects.annotate(
+            live_favorites=_count_of(Favorite, 'recipe'),
+            live_shopping_list=_count_of(ShopList, 'recipe'),
+        ).filter(
+            ~Q(favorites_count=F('live_favorites'))
+            | ~Q(shopping_list_count=F('live_shopping_list'))
+        )
+        self.stdout.write(f'Рецептов с расхождениями: {recipes.count()}')
+        profiles = Profile.objects.annotate(
+            **{f'live_{name}': value
+               for name, value in Profile.objects.live_counts().items()}
+        ).filter(
+            ~Q(recipes_count=F('live_recipes_count'))
+            | ~Q(followers_count=F('live_followers_count'))
+        )
+        self.stdout.write(f'Профилей с расхождениями: {profiles.count()}')
+        missing = User.objects.filter(profile__isnull=True).count()
+        self.stdout.write(f'Пользователей без профиля: {missing}')
+        if options['dry_run']:
+            return
+        fixed = Recipe.objects.filter(
+            pk__in=recipes.values('pk')
+        ).update(
+            favorites_count=_count_of(Favorite, 'recipe'),
+            shopping_list_count=_count_of(ShopList, 'recipe'),
+        )
+        refreshed = Profile.objects.refresh()
+        self.stdout.write(self.style.SUCCESS(
+            f'Исправлено рецептов: {fixed}, пересчитано профилей: {refreshed}'
+        ))
@@ -0,0 +1,191 @@
+import io
+import random
+
+from django.contrib.auth.hashers import make_password
+from django.core.files.base import ContentFile
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from PIL import Image
+
+from recipe.api.payload_cache import recipe_payload_cache
+from recipe.models import (Favorite, FeedEntry, Follow, Ingredient,
+                           IngredientRecord, Recipe, ShopList,
+                           ShopListIngredient, Tag, User, bulk_batch_size)
+from recipe.search import update_search_vectors
+from recipe.versions import bump
+
+USERNAME_PREFIX = 'seed_'
+PASSWORD = 'seed-password'
+WORDS = (
+    'суп', 'салат', 'пирог', 'рагу', 'каша', 'запеканка', 'омлет', 'паста',
+    'курица', 'говядина', 'рыба', 'грибы', 'сыр', 'томаты', 'картофель',
+    'капуста', 'тыква', 'яблоки', 'ягоды', 'шоколад', 'быстрый',
+    'домашний', 'острый', 'летний', 'постный', 'праздничный',
+)
+UNITS = ('г', 'кг', 'мл', 'л', 'шт.', 'ст. л.', 'ч. л.', 'по вкусу')
+
+
+class Command(BaseCommand):
+    help = ('Создаёт воспроизводимый набор тестовых данных: пользователей, '
+            'рецепты, избранное, списки покупок и подписки')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=100)
+        parser.add_argument('--recipes-per-user', type=int, default=10)
+        parser.add_argument('--ingredients-per-recipe', type=int, default=8)
+        parser.add_argument(
+            '--ingredients', type=int, default=500,
+            help='Сколько ингредиентов должно быть в справочнике',
+        )
+        parser.add_argument('--tags', type=int, default=6)
+        parser.add_argument('--favorites-per-user', type=int, default=20)
+        parser.add_argument('--cart-per-user', type=int, default=5)
+        parser.add_argument('--follows-per-user', type=int, default=10)
+        parser.add_argument(
+            '--seed', type=int, default=42,
+            help='Зерно генератора: одинаковые параметры дают одинаковые '
+                 'данные',
+        )
+        parser.add_argument(
+            '--flush',
+            action='store_true',
+            help='Сначала удалить ранее созданных тестовых пользователей '
+                 'вместе с их данными',
+        )
+
+    def handle(self, *args, **options):
+        seeded = User.objects.filter(username__startswith=USERNAME_PREFIX)
+        if options['flush']:
+            deleted, _ = seeded.delete()
+            self.stdout.write(f'Удалено объектов: {deleted}')
+        elif seeded.exists():
+            raise CommandError(
+                'Тестовые данные уже созданы, используйте --flush')
+        self.random = random.Random(options['seed'])
+        with transaction.atomic():
+            tags = self._tags(options['tags'])
+            ingredients = self._ingredients(options['ingredients'])
+            users = self._users(options['users'])
+            recipes = self._recipes(
+                users, tags, ingredients, options['recipes_per_user'],
+                options['ingredients_per_recipe'])
+            self._relations(users, recipes, options)
+        self._refresh_derived()
+        self.stdout.write(self.style.SUCCESS(
+            f'Создано пользователей: {len(users)}, рецептов: {len(recipes)}. '
+            f'Пароль пользователей: {PASSWORD}'
+        ))
+
+    def _tags(self, count):
+        tags = []
+        for number in range(count):
+            tag, _ = Tag.objects.get_or_create(
+                slug=f'seed-{number}',
+                defaults={
+                    'name': f'Тег {number}',
+                    'color': f'#{number * 0x2f4f7d % 0x1000000:06x}',
+                },
+            )
+            tags.append(tag)
+        return tags
+
+    def _ingredients(self, count):
+        missing = count - Ingredient.objects.count()
+        if missing > 0:
+            existing = set(Ingredient.objects.values_list('name', flat=True))
+            Ingredient.objects.bulk_create([
+                Ingredient(
+                    name=f'ингредиент {number}',
+                    measurement_unit=UNITS[number % len(UNITS)],
+                )
+                for number in range(count * 2)
+                if f'ингредиент {number}' not in existing
+            ][:missing], batch_size=bulk_batch_size(Ingredient))
+        return list(Ingredient.objects.order_by('id').values_list(
+            'id', flat=True)[:count])
+
+    def _users(self, count):
+        password = make_password(PASSWORD)
+        User.objects.bulk_create([
+            User(
+                username=f'{USERNAME_PREFIX}{number}',
+                email=f'{USERNAME_PREFIX}{number}@example.com',
+                first_name=f'Имя{number}',
+                last_name=f'Фамилия{number}',
+                password=password,
+            )
+            for number in range(count)
+        ], batch_size=bulk_batch_size(User))
+        return list(User.objects.filter(
+            username__startswith=USERNAME_PREFIX).order_by('id'))
+
+    def _recipes(self, users, tags, ingredients, per_user, per_recipe):
+        image = self._image()
+        Recipe.objects.bulk_create([
+            Recipe(
+                author=author,
+                name=' '.join(self.random.sample(WORDS, 3)).capitalize(),
+                text=' '.join(self.random.choices(WORDS, k=30)),
+                image=image,
+                cooking_time=self.random.randint(5, 180),
+            )
+            for author in users for _ in range(per_user)
+        ], batch_size=bulk_batch_size(Recipe))
+        recipes = list(Recipe.objects.filter(
+            author__in=users).order_by('id').values_list('id', flat=True))
+        through = Recipe.tags.through
+        through.objects.bulk_create([
+            through(recipe_id=recipe, tag_id=tag.id)
+            for recipe in recipes
+            for tag in self.random.sample(tags, min(len(tags), 2))
+        ], batch_size=bulk_batch_size(through))
+        per_recipe = min(per_recipe, len(ingredients))
+        IngredientRecord.objects.bulk_create([
+            IngredientRecord(
+                recipe_id=recipe, ingredient_id=ingredient,
+                amount=self.random.randint(1, 500),
+            )
+            for recipe in recipes
+            for ingredient in self.random.sample(ingredients, per_recipe)
+        ], batch_size=bulk_batch_size(IngredientRecord))
+        return recipes
+
+    def _relations(self, users, recipes, options):
+        user_ids = [user.id for user in users]
+        for model, field, targets, per_user in (
+            (Favorite, 'recipe_id', recipes, options['favorites_per_user']),
+            (ShopList, 'recipe_id', recipes, options['cart_per_user']),
+            (Follow, 'author_id', user_ids, options['follows_per_user']),
+        ):
+            rows = []
+            for user_id in user_ids:
+                candidates = [
+                    target for target in self.random.sample(
+                        targets, min(len(targets), per_user + 1))
+                    if model is not Follow or target != user_id
+                ][:per_user]
+                rows.extend(
+                    model(user_id=user_id, **{field: target})
+                    for target in candidates
+                )
+            model.objects.bulk_create(
+                rows, batch_size=bulk_batch_size(model))
+
+    @staticmethod
+    def _image():
+        content = io.BytesIO()
+        Image.new('RGB', (64, 64), (230, 120, 40)).save(content, 'JPEG')
+        storage = Recipe._meta.get_field('image').storage
+        return storage.save(
+            'recipes/seed.jpg', ContentFile(content.getvalue()))
+
+    def _refresh_derived(self):
+        ShopListIngredient.objects.rebuild()
+        call_command('reconcile_counters', stdout=io.StringIO())
+        FeedEntry.objects.rebuild()
+        update_search_vectors(Recipe.objects.all())
+        for name in ('tag', 'ingredient', 'user', 'recipe_search',
+                     'recipe_similarity'):
+            bump(name)
+        recipe_payload_cache.clear()
@@ -0,0 +1,269 @@
+import bisect
+import logging
+import threading
+import time
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import connection
+
+from foodgram.db.pool import pools
+
+logger = logging.getLogger(__name__)
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5)
+QUERY_BUCKETS = (1, 2, 3, 5, 10, 20, 50, 100)
+SIZE_BUCKETS = (1024, 4096, 16384, 65536, 262144, 1048576)
+
+
+class Histogram:
+    __slots__ = ('buckets', 'counts', 'sum', 'count')
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def cumulative(self):
+        total = 0
+        for bound, count in zip((*self.buckets, '+Inf'), self.counts):
+            total += count
+            yield bound, total
+
+
+class EndpointStats:
+    __slots__ = ('duration', 'queries', 'size', 'query_seconds',
+                 'over_budget')
+
+    def __init__(self):
+        self.duration = Histogram(DURATION_BUCKETS)
+        self.queries = Histogram(QUERY_BUCKETS)
+        self.size = Histogram(SIZE_BUCKETS)
+        self.query_seconds = 0
+        self.over_budget = 0
+
+
+class MetricsRegistry:
+    """Метрики запросов процесса в разрезе view, метода и статуса.
+
+    Каждый процесс gunicorn хранит свои значения: при нескольких
+    воркерах один сбор показывает метрики того воркера, который
+    ответил на запрос.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stats = defaultdict(EndpointStats)
+        self._overhead = Histogram(())
+
+    def record(self, labels, duration, queries, query_seconds, size,
+               over_budget):
+        with self._lock:
+            stats = self._stats[labels]
+            stats.duration.observe(duration)
+            stats.queries.observe(queries)
+            stats.size.observe(size)
+            stats.query_seconds += query_seconds
+            stats.over_budget += over_budget
+
+    def record_overhead(self, seconds):
+        with self._lock:
+            self._overhead.observe(seconds)
+
+    def clear(self):
+        with self._lock:
+            self._stats.clear()
+            self._overhead = Histogram(())
+
+    def render(self):
+        with self._lock:
+            stats = sorted(self._stats.items())
+            lines = []
+            for name, kind, help_text, get in METRICS:
+                lines.append(f'# HELP {name} {help_text}')
+                lines.append(f'# TYPE {name} {kind}')
+                for labels, endpoint in stats:
+                    lines.extend(_render_value(
+                        name, kind, _labels(labels), get(endpoint)))
+            lines.append(
+                '# HELP foodgram_metrics_overhead_seconds '
+                'Время учёта метрик внутри запроса')
+            lines.append('# TYPE foodgram_metrics_overhead_seconds summary')
+            lines.append(
+                f'foodgram_metrics_overhead_seconds_sum '
+                f'{self._overhead.sum}')
+            lines.append(
+                f'foodgram_metrics_overhead_seconds_count '
+                f'{self._overhead.count}')
+        lines.extend(_render_pools())
+        return '\n'.join(lines) + '\n'
+
+
+METRICS = (
+    ('foodgram_request_duration_seconds', 'histogram',
+     'Длительность обработки запроса', lambda stats: stats.duration),
+    ('foodgram_request_queries', 'histogram',
+     'Количество запросов к базе данных за запрос',
+     lambda stats: stats.queries),
+    ('foodgram_response_size_bytes', 'histogram',
+     'Размер тела ответа',
+     lambda stats: stats.size),
+    ('foodgram_db_query_duration_seconds_total', 'counter',
+     'Суммарное время запросов к базе данных',
+     lambda stats: stats.query_seconds),
+    ('foodgram_query_budget_exceeded_total', 'counter',
+     'Запросы, превысившие METRICS_QUERY_BUDGET',
+     lambda stats: stats.over_budget),
+)
+
+POOL_METRICS = (
+    ('foodgram_db_pool_size', 'gauge',
+     'Наибольшее число соединений в пуле', lambda pool: pool.size),
+    ('foodgram_db_pool_in_use', 'gauge',
+     'Выданные из пула соединения', lambda pool: pool.in_use),
+    ('foodgram_db_pool_idle', 'gauge',
+     'Свободные соединения пула', lambda pool: pool.idle),
+    ('foodgram_db_pool_checkouts_total', 'counter',
+     'Запросы соединения из пула', lambda pool: pool.stats.checkouts),
+    ('foodgram_db_pool_waits_total', 'counter',
+     'Запросы соединения, ожидавшие освобождения пула',
+     lambda pool: pool.stats.waits),
+    ('foodgram_db_pool_wait_seconds_total', 'counter',
+     'Суммарное время ожидания соединения',
+     lambda pool: pool.stats.wait_seconds),
+    ('foodgram_db_pool_timeouts_total', 'counter',
+     'Запросы соединения, не дождавшиеся его за DB_POOL_TIMEOUT',
+     lambda pool: pool.stats.timeouts),
+    ('foodgram_db_pool_created_total', 'counter',
+     'Открытые пулом соединения', lambda pool: pool.stats.created),
+    ('foodgram_db_pool_recycled_total', 'counter',
+     'Соединения, закрытые по DB_POOL_MAX_LIFETIME',
+     lambda pool: pool.stats.recycled),
+    ('foodgram_db_pool_failed_checks_total', 'counter',
+     'Соединения, не прошедшие проверку при выдаче',
+     lambda pool: pool.stats.failed_checks),
+)
+
+
+def _render_pools():
+    current = sorted(pools().items())
+    if not current:
+        return []
+    lines = []
+    for name, kind, help_text, get in POOL_METRICS:
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} {kind}')
+        for alias, pool in current:
+            lines.append(f'{name}{{database="{alias}"}} {get(pool)}')
+    return lines
+
+
+def _labels(labels):
+    view, method, status = labels
+    return f'view="{view}",method="{method}",status="{status}"'
+
+
+def _render_value(name, kind, labels, value):
+    if kind != 'histogram':
+        return [f'{name}{{{labels}}} {value}']
+    lines = [
+        f'{name}_bucket{{{labels},le="{bound}"}} {count}'
+        for bound, count in value.cumulative()
+    ]
+    lines.append(f'{name}_sum{{{labels}}} {value.sum}')
+    lines.append(f'{name}_count{{{labels}}} {value.count}')
+    return lines
+
+
+def view_name(request):
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return 'unresolved'
+    func = match.func
+    view_class = getattr(func, 'cls', None) or getattr(
+        func, 'view_class', None)
+    if view_class is None:
+        return f'{func.__module__}.{func.__name__}'
+    actions = getattr(func, 'actions', None)
+    if actions:
+        action = actions.get(request.method.lower(), 'unknown')
+        return f'{view_class.__name__}.{action}'
+    return view_class.__name__
+
+
+class QueryCounter:
+    __slots__ = ('count', 'seconds')
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.seconds += time.perf_counter() - start
+            self.count += 1
+
+
+class MetricsMiddleware:
+    """Собирает длительность, число и время запросов к БД и размер ответа.
+
+    Потоковые ответы учитываются, когда тело отдано целиком: запросы,
+    выполненные при формировании тела, тоже попадают в счётчик.
+    При превышении METRICS_QUERY_BUDGET запросов к базе пишет
+    предупреждение в лог. Время собственного учёта после ответа
+    публикуется как foodgram_metrics_overhead_seconds.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        start = time.perf_counter()
+        counter = QueryCounter()
+        with connection.execute_wrapper(counter):
+            response = self.get_response(request)
+        if response.streaming:
+            response.streaming_content = self._stream(
+                request, response, response.streaming_content, start,
+                counter)
+        else:
+            self._record(
+                request, response, start, counter, len(response.content))
+        return response
+
+    def _stream(self, request, response, content, start, counter):
+        size = 0
+        try:
+            with connection.execute_wrapper(counter):
+                for chunk in content:
+                    size += len(chunk)
+                    yield chunk
+        finally:
+            self._record(request, response, start, counter, size)
+
+    @staticmethod
+    def _record(request, response, start, counter, size):
+        duration = time.perf_counter() - start
+        budget = settings.METRICS_QUERY_BUDGET
+        over_budget = bool(budget) and counter.count > budget
+        view = view_name(request)
+        if over_budget:
+            logger.warning(
+                '%s %s: %d запросов к базе при бюджете %d',
+                request.method, view, counter.count, budget)
+        metrics.record(
+            (view, request.method, response.status_code), duration,
+            counter.count, counter.seconds, size, over_budget)
+        metrics.record_overhead(time.perf_counter() - start - duration)
+
+
+metrics = MetricsRegistry()
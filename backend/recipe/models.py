@@ -1,10 +1,28 @@
+from django.conf import settings
 from django.contrib.auth import get_user_model
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVectorField
 from django.core.exceptions import ValidationError
-from django.db import models
+from django.db import IntegrityError, connection, models, transaction
+from django.db.models import (Case, Count, F, FloatField, IntegerField,
+                              OuterRef, Subquery, Sum, Value, When, Window)
+from django.db.models.functions import Coalesce, RowNumber
+
+from .storage import ContentAddressedStorage
 
 User = get_user_model()
 
 
+def bulk_batch_size(model, size=1000):
+    """Размер пачки bulk_create в пределах лимита параметров запроса."""
+    max_params = connection.features.max_query_params
+    if max_params:
+        fields = sum(
+            not field.primary_key for field in model._meta.concrete_fields)
+        size = min(size, max_params // fields)
+    return size
+
+
 class Ingredient(models.Model):
     name = models.CharField(
         verbose_name='Название',
@@ -40,6 +58,8 @@ class Tag(models.Model):
 
 
 class Recipe(models.Model):
+    COUNTER_FIELDS = ('favorites_count', 'shopping_list_count')
+    DERIVED_FIELDS = (*COUNTER_FIELDS, 'search_vector')
 
     author = models.ForeignKey(
         User,
@@ -48,7 +68,9 @@ class Recipe(models.Model):
         related_name='recipes'
     )
     name = models.CharField(max_length=255, verbose_name='Название')
-    image = models.ImageField('Изображение', upload_to='recipes/')
+    image = models.ImageField(
+        'Изображение', upload_to='recipes/',
+        storage=ContentAddressedStorage())
     text = models.TextField('Описание')
     ingredients = models.ManyToManyField(
         Ingredient, verbose_name='Ингредиенты',
@@ -59,15 +81,39 @@ class Recipe(models.Model):
         Tag, related_name='recipes', verbose_name='Тег')
     cooking_time = models.PositiveSmallIntegerField(
         'Время приготовления в минутах', default=1)
+    image_renditions_ready = models.BooleanField(
+        'Уменьшенные копии изображения готовы', default=False)
+    updated_at = models.DateTimeField('Дата изменения', auto_now=True)
+    favorites_count = models.IntegerField(
+        'Добавлений в избранное', default=0)
+    shopping_list_count = models.IntegerField(
+        'Добавлений в список покупок', default=0)
+    search_vector = SearchVectorField(
+        'Поисковый вектор', null=True, editable=False)
 
     class Meta:
         verbose_name = 'Рецепт'
         verbose_name_plural = 'Рецепты'
         ordering = ['-id']
+        indexes = [
+            models.Index(
+                fields=['author', '-id'], name='recipe_author_id_idx'),
+            GinIndex(
+                fields=['search_vector'], name='recipe_search_vector_idx'),
+        ]
 
     def __str__(self) -> str:
         return self.name
 
+    def save(self, *args, **kwargs):
+        if not self._state.adding and kwargs.get('update_fields') is None:
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key
+                and field.name not in self.DERIVED_FIELDS
+            ]
+        super().save(*args, **kwargs)
+
     def validate_cooking_time(self):
         if self.cooking_time < 0:
             raise ValidationError('Время не может быть отрицательное')
@@ -112,7 +158,7 @@ class ShopList(models.Model):
         verbose_name_plural = 'Списки покупак'
         constraints = [
             models.UniqueConstraint(
-                fields=['recipe', 'user'], name='unique_shopping_list')
+                fields=['user', 'recipe'], name='unique_shopping_list')
         ]
 
     def __str__(self) -> str:
@@ -171,3 +217,352 @@ class IngredientRecord(models.Model):
 
     def __unicode__(self):
         return f'?{self.recipe}: {self.ingredient} - {self.amount}'
+
+
+class ShopListIngredientManager(models.Manager):
+
+    def live_totals(self, users=None):
+        if users is None:
+            lookup = {'recipe__shopping_list__isnull': False}
+        else:
+            lookup = {'recipe__shopping_list__user__in': users}
+        return IngredientRecord.objects.filter(**lookup).values(
+            'ingredient_id', user_id=F('recipe__shopping_list__user')
+        ).annotate(
+            total_amount=Sum(Coalesce('amount', Value(0.0))),
+            records_count=Count('id'),
+        ).order_by()
+
+    def rebuild(self, users=None):
+        with transaction.atomic():
+            stale = self.all() if users is None else self.filter(
+                user__in=users)
+            stale.delete()
+            self.bulk_create(
+                (self.model(
+                    user_id=row['user_id'],
+                    ingredient_id=row['ingredient_id'],
+                    amount=row['total_amount'],
+                    records=row['records_count'],
+                ) for row in self.live_totals(users).iterator()),
+                batch_size=bulk_batch_size(self.model),
+            )
+
+    def add_recipe(self, user_id, recipe_id):
+        amounts = self._recipe_amounts(recipe_id)
+        if not amounts:
+            return
+        try:
+            with transaction.atomic():
+                self._add_amounts(user_id, amounts)
+        except IntegrityError:
+            # Параллельный запрос успел создать строки для тех же
+            # ингредиентов: теперь они есть и будут обновлены.
+            with transaction.atomic():
+                self._add_amounts(user_id, amounts)
+
+    def _add_amounts(self, user_id, amounts):
+        existing = self._locked_ingredients(user_id, amounts)
+        if existing:
+            self._shift(user_id, {
+                ingredient_id: amount
+                for ingredient_id, amount in amounts.items()
+                if ingredient_id in existing
+            }, sign=1)
+        self.bulk_create([
+            self.model(
+                user_id=user_id, ingredient_id=ingredient_id,
+                amount=amount, records=1,
+            )
+            for ingredient_id, amount in amounts.items()
+            if ingredient_id not in existing
+        ])
+
+    def _locked_ingredients(self, user_id, ingredient_ids):
+        return set(self.select_for_update().filter(
+            user_id=user_id, ingredient_id__in=ingredient_ids
+        ).values_list('ingredient_id', flat=True))
+
+    def remove_recipe(self, user_id, recipe_id):
+        amounts = self._recipe_amounts(recipe_id)
+        if not amounts:
+            return
+        with transaction.atomic():
+            self._shift(user_id, amounts, sign=-1)
+            self.filter(user_id=user_id, records__lte=0).delete()
+
+    def _shift(self, user_id, amounts, sign):
+        delta = Case(
+            *(When(ingredient_id=ingredient_id, then=Value(sign * amount))
+              for ingredient_id, amount in amounts.items()),
+            output_field=FloatField(),
+        )
+        self.filter(user_id=user_id, ingredient_id__in=amounts).update(
+            amount=F('amount') + delta,
+            records=F('records') + sign,
+        )
+
+    def change_recipe(self, recipe_id, changes):
+        """Переносит изменение ингредиентов рецепта в списки покупок.
+
+        ``changes`` — словарь ``{id ингредиента: (изменение количества,
+        изменение числа рецептов)}``; списки пересчитываются сдвигом,
+        а не полной пересборкой.
+        """
+        users = list(ShopList.objects.filter(
+            recipe_id=recipe_id).values_list('user_id', flat=True))
+        if not users or not changes:
+            return
+        with transaction.atomic(savepoint=False):
+            self.filter(user_id__in=users, ingredient_id__in=changes).update(
+                amount=F('amount') + self._delta(changes, 0, FloatField()),
+                records=F('records') + self._delta(
+                    changes, 1, IntegerField()),
+            )
+            # Для новых ингредиентов строки есть не у всех: недостающие
+            # создаются, уже сдвинутые пропускаются.
+            self.bulk_create([
+                self.model(user_id=user_id, ingredient_id=ingredient_id,
+                           amount=amount, records=1)
+                for ingredient_id, (amount, records) in changes.items()
+                if records > 0
+                for user_id in users
+            ], ignore_conflicts=True)
+            if any(records < 0 for _, records in changes.values()):
+                self.filter(user_id__in=users, ingredient_id__in=changes,
+                            records__lte=0).delete()
+
+    @staticmethod
+    def _delta(changes, position, output_field):
+        return Case(
+            *(When(ingredient_id=ingredient_id, then=Value(delta[position]))
+              for ingredient_id, delta in changes.items()),
+            default=Value(0),
+            output_field=output_field,
+        )
+
+    @staticmethod
+    def _recipe_amounts(recipe_id):
+        return {
+            ingredient_id: amount or 0
+            for ingredient_id, amount in IngredientRecord.objects.filter(
+                recipe_id=recipe_id
+            ).values_list('ingredient_id', 'amount')
+        }
+
+
+class ShopListIngredient(models.Model):
+
+    user = models.ForeignKey(
+        User, on_delete=models.CASCADE,
+        related_name='shopping_list_ingredients',
+        verbose_name='Пользователь'
+    )
+    ingredient = models.ForeignKey(
+        Ingredient, on_delete=models.CASCADE,
+        related_name='shopping_list_totals',
+        verbose_name='Ингредиент'
+    )
+    amount = models.FloatField('Количество', default=0)
+    records = models.IntegerField(
+        'Количество рецептов с ингредиентом', default=0)
+
+    objects = ShopListIngredientManager()
+
+    class Meta:
+        verbose_name = 'Ингредиент из списка покупок'
+        verbose_name_plural = 'Ингредиенты из списков покупок'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'ingredient'],
+                name='unique_shopping_list_ingredient')
+        ]
+
+    def __str__(self) -> str:
+        return f'{self.user.username} -> {self.ingredient} - {self.amount}'
+
+
+class ProfileManager(models.Manager):
+
+    def live_counts(self):
+        return {
+            'recipes_count': Coalesce(Subquery(
+                Recipe.objects.filter(
+                    author=OuterRef('user')
+                ).order_by().values('author').annotate(
+                    count=Count('id')).values('count')
+            ), 0),
+            'followers_count': Coalesce(Subquery(
+                Follow.objects.filter(
+                    author=OuterRef('user')
+                ).order_by().values('author').annotate(
+                    count=Count('id')).values('count')
+            ), 0),
+        }
+
+    def refresh(self, users=None):
+        missing = User.objects.filter(profile__isnull=True)
+        if users is not None:
+            missing = missing.filter(pk__in=users)
+        self.bulk_create(
+            [self.model(user_id=user_id)
+             for user_id in missing.values_list('id', flat=True)],
+            ignore_conflicts=True,
+        )
+        profiles = self.all() if users is None else self.filter(
+            user__in=users)
+        return profiles.update(**self.live_counts())
+
+    def shift(self, user_id, field, delta):
+        updated = self.filter(user_id=user_id).update(
+            **{field: F(field) + delta})
+        if not updated and delta > 0:
+            self.refresh([user_id])
+
+
+class Profile(models.Model):
+
+    user = models.OneToOneField(
+        User, on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='profile',
+        verbose_name='Пользователь'
+    )
+    recipes_count = models.IntegerField('Количество рецептов', default=0)
+    followers_count = models.IntegerField(
+        'Количество подписчиков', default=0)
+
+    objects = ProfileManager()
+
+    class Meta:
+        verbose_name = 'Профиль'
+        verbose_name_plural = 'Профили'
+
+    def __str__(self) -> str:
+        return f'{self.user.username}: {self.recipes_count} рецептов'
+
+
+class FeedEntryManager(models.Manager):
+    """Ленты подписок: рецепты авторов, на которых подписан пользователь.
+
+    Новые рецепты раскладываются по лентам подписчиков при записи.
+    Рецепты авторов, у которых подписчиков больше FEED_FANOUT_LIMIT,
+    в ленты не пишутся и читаются из Recipe при запросе ленты. Каждая
+    лента хранит не больше FEED_LENGTH последних рецептов.
+    """
+
+    @staticmethod
+    def fans_out(author_id):
+        return not Profile.objects.filter(
+            user_id=author_id,
+            followers_count__gt=settings.FEED_FANOUT_LIMIT,
+        ).exists()
+
+    def fan_out(self, recipe_id, author_id):
+        if not self.fans_out(author_id):
+            return
+        followers = list(Follow.objects.filter(
+            author_id=author_id).values_list('user_id', flat=True))
+        self.bulk_create(
+            [self.model(user_id=user_id, recipe_id=recipe_id,
+                        author_id=author_id)
+             for user_id in followers],
+            batch_size=bulk_batch_size(self.model),
+            ignore_conflicts=True,
+        )
+        self.trim(followers)
+
+    def backfill(self, user_id, author_id):
+        if not self.fans_out(author_id):
+            return
+        recipes = Recipe.objects.filter(author_id=author_id).order_by(
+            '-id').values_list('id', flat=True)[:settings.FEED_LENGTH]
+        self.bulk_create(
+            [self.model(user_id=user_id, recipe_id=recipe_id,
+                        author_id=author_id)
+             for recipe_id in recipes],
+            batch_size=bulk_batch_size(self.model),
+            ignore_conflicts=True,
+        )
+        self.trim([user_id])
+
+    def forget(self, user_id, author_id):
+        self.filter(user_id=user_id, author_id=author_id).delete()
+
+    def trim(self, users):
+        users = list(users)
+        step = bulk_batch_size(self.model, 500)
+        for start in range(0, len(users), step):
+            ranked = self.filter(
+                user_id__in=users[start:start + step]
+            ).annotate(
+                feed_position=Window(
+                    expression=RowNumber(),
+                    partition_by=[F('user_id')],
+                    order_by=F('recipe_id').desc(),
+                )
+            ).values('id', 'feed_position').order_by()
+            sql, params = ranked.query.sql_with_params()
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    f'DELETE FROM {self.model._meta.db_table} '
+                    f'WHERE id IN (SELECT id FROM ({sql}) ranked '
+                    f'WHERE feed_position > %s)',
+                    (*params, settings.FEED_LENGTH)
+                )
+
+    def rebuild(self, users=None):
+        follows = Follow.objects.exclude(
+            author__profile__followers_count__gt=settings.FEED_FANOUT_LIMIT)
+        if users is not None:
+            follows = follows.filter(user__in=users)
+        with transaction.atomic():
+            stale = self.all() if users is None else self.filter(
+                user__in=users)
+            stale.delete()
+            rows = follows.filter(author__recipes__isnull=False).values_list(
+                'user_id', 'author_id', 'author__recipes__id')
+            self.bulk_create(
+                (self.model(user_id=user_id, recipe_id=recipe_id,
+                            author_id=author_id)
+                 for user_id, author_id, recipe_id in rows.iterator()),
+                batch_size=bulk_batch_size(self.model),
+            )
+            self.trim(follows.values_list('user_id', flat=True).distinct())
+
+
+class FeedEntry(models.Model):
+
+    user = models.ForeignKey(
+        User, on_delete=models.CASCADE,
+        related_name='feed_entries',
+        verbose_name='Пользователь'
+    )
+    recipe = models.ForeignKey(
+        Recipe, on_delete=models.CASCADE,
+        related_name='feed_entries',
+        verbose_name='Рецепт'
+    )
+    author = models.ForeignKey(
+        User, on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name='Автор рецепта'
+    )
+
+    objects = FeedEntryManager()
+
+    class Meta:
+        verbose_name = 'Запись ленты подписок'
+        verbose_name_plural = 'Записи лент подписок'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'recipe'], name='unique_feed_entry')
+        ]
+        indexes = [
+            models.Index(fields=['user', '-recipe'], name='feed_user_idx'),
+            models.Index(fields=['user', 'author'],
+                         name='feed_user_author_idx'),
+        ]
+
+    def __str__(self) -> str:
+        return f'{self.user.username} <- {self.recipe}'
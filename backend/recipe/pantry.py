@@ -0,0 +1,76 @@
+from .models import Recipe
+from .similarity import similar_recipes_index
+
+popcount = getattr(int, 'bit_count', lambda value: bin(value).count('1'))
+
+
+def _positions(bitmap, skip, take):
+    """Позиции установленных битов от старших к младшим."""
+    digits = bin(bitmap)
+    found, index = [], 1
+    while len(found) < take:
+        index = digits.find('1', index + 1)
+        if index == -1:
+            break
+        if skip:
+            skip -= 1
+        else:
+            found.append(len(digits) - 1 - index)
+    return found
+
+
+class PantryMatches:
+    """Рецепты, которые можно приготовить из ингредиентов кладовой.
+
+    Рецепты идут по убыванию доли ингредиентов, которые уже есть, затем
+    по числу совпавших, затем новые раньше. Для Paginator объект ведёт
+    себя как queryset: count() и срез, а id рецептов извлекаются только
+    из битовых карт групп, попавших в срез. У рецептов страницы заполнены
+    coverage и missing_ingredients.
+    """
+
+    def __init__(self, ingredient_ids, recipe_ids=None):
+        self.pantry = frozenset(ingredient_ids)
+        self._groups, self._row_ids = similar_recipes_index.cover(
+            self.pantry, recipe_ids)
+        self._sizes = [popcount(bitmap) for _, _, bitmap in self._groups]
+        self._pages = {}
+
+    def count(self):
+        return sum(self._sizes)
+
+    def __len__(self):
+        return self.count()
+
+    def __getitem__(self, page):
+        if not isinstance(page, slice) or page.step:
+            raise TypeError('PantryMatches поддерживает только срезы')
+        start, stop = page.start or 0, page.stop
+        if stop is None:
+            stop = self.count()
+        if (start, stop) not in self._pages:
+            self._pages[start, stop] = self._fetch(start, stop)
+        return self._pages[start, stop]
+
+    def _fetch(self, start, stop):
+        coverage = {}
+        for (share, _, bitmap), size in zip(self._groups, self._sizes):
+            if start >= size:
+                start, stop = start - size, stop - size
+                continue
+            for position in _positions(bitmap, start, stop - start):
+                coverage[self._row_ids[position]] = share
+            start, stop = 0, stop - size
+            if stop <= 0:
+                break
+        recipes = Recipe.objects.in_bulk(list(coverage))
+        ingredients = similar_recipes_index.ingredients(coverage)
+        page = []
+        for recipe_id, share in coverage.items():
+            recipe = recipes.get(recipe_id)
+            if recipe is None:
+                continue
+            recipe.coverage = share
+            recipe.missing_ingredients = ingredients[recipe_id] - self.pantry
+            page.append(recipe)
+        return page
@@ -0,0 +1,43 @@
+import re
+
+from django.db import connection
+
+from .models import Favorite, Follow, Recipe, ShopList, ShopListIngredient
+
+SEQUENTIAL_SCAN = {
+    'postgresql': re.compile(r'Seq Scan on (\w+)'),
+    'sqlite': re.compile(r'\bSCAN (?:TABLE )?(\w+)\b(?! USING)'),
+}
+
+
+def hot_queries(user_id, recipe_id, tag_slug):
+    return {
+        'Favorite(user, recipe)': Favorite.objects.filter(
+            user_id=user_id, recipe_id=recipe_id),
+        'ShopList(user, recipe)': ShopList.objects.filter(
+            user_id=user_id, recipe_id=recipe_id),
+        'ShopList(user)': ShopList.objects.filter(user_id=user_id),
+        'Follow(user, author)': Follow.objects.filter(
+            user_id=user_id, author_id=user_id),
+        'Follow(user)': Follow.objects.filter(user_id=user_id),
+        'Recipe(author, -id)': Recipe.objects.filter(
+            author_id=user_id).order_by('-id')[:3],
+        'Recipe(tags__slug)': Recipe.objects.filter(tags__slug=tag_slug),
+        'ShopListIngredient(user)': ShopListIngredient.objects.filter(
+            user_id=user_id),
+    }
+
+
+def disable_sequential_scans():
+    """Запрещает планировщику postgres последовательное чтение до конца
+    транзакции: на маленьких таблицах оно дешевле индекса и скрыло бы
+    отсутствующий индекс."""
+    if connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            cursor.execute('SET LOCAL enable_seqscan = off')
+
+
+def sequential_scans(queryset):
+    """Возвращает план запроса и таблицы, которые он читает целиком."""
+    plan = queryset.explain()
+    return plan, SEQUENTIAL_SCAN[connection.vendor].findall(plan)
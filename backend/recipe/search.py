@@ -0,0 +1,122 @@
+import bisect
+import re
+import threading
+from collections import defaultdict
+
+from django.contrib.postgres.search import (SearchQuery, SearchRank,
+                                            SearchVector)
+from django.db import connections
+from django.db.models import Case, F, FloatField, Value, When
+
+from .models import Recipe
+from .versions import get_version
+
+SEARCH_CONFIG = 'russian'
+SEARCH_FIELDS = (('name', 'A', 1.0), ('text', 'B', 0.4))
+UPPER_BOUND = chr(0x10FFFF)
+WORD_RE = re.compile(r'\w+')
+
+
+def uses_postgres(using='default'):
+    return connections[using].vendor == 'postgresql'
+
+
+def search_vector():
+    vectors = [
+        SearchVector(field, weight=weight, config=SEARCH_CONFIG)
+        for field, weight, _ in SEARCH_FIELDS
+    ]
+    vector = vectors[0]
+    for other in vectors[1:]:
+        vector = vector + other
+    return vector
+
+
+def update_search_vectors(queryset):
+    if uses_postgres(queryset.db):
+        return queryset.update(search_vector=search_vector())
+    return 0
+
+
+def search_recipes(queryset, query):
+    """Возвращает подходящие под запрос рецепты и выражение их ранга.
+
+    Ранг не аннотируется, а используется только для сортировки, поэтому
+    подсчёт количества результатов его не вычисляет.
+    """
+    if uses_postgres(queryset.db):
+        search_query = SearchQuery(query, config=SEARCH_CONFIG)
+        return (
+            queryset.filter(search_vector=search_query),
+            SearchRank(F('search_vector'), search_query),
+        )
+    ranks = recipe_search_index.search(query)
+    if not ranks:
+        return queryset.none(), Value(0.0, output_field=FloatField())
+    return queryset.filter(pk__in=ranks), Case(
+        *[When(pk=pk, then=Value(rank)) for pk, rank in ranks.items()],
+        output_field=FloatField(),
+    )
+
+
+class RecipeSearchIndex:
+    """Обратный индекс слов рецептов в памяти процесса.
+
+    Используется вместо tsvector на базах, отличных от PostgreSQL.
+    Слово запроса совпадает со всеми словами, которые с него начинаются,
+    — грубая замена стемминга; рецепт должен содержать все слова запроса.
+    Индекс перестраивается, когда меняется версия в кэше.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._version = None
+        self._index = ([], {})
+
+    def search(self, query):
+        self._ensure_fresh()
+        words, postings = self._index
+        ranks = None
+        for term in set(WORD_RE.findall(query.casefold())):
+            scores = defaultdict(float)
+            for word in self._prefix_range(words, term):
+                for pk, score in postings[word].items():
+                    scores[pk] += score
+            if ranks is None:
+                ranks = scores
+            else:
+                ranks = {
+                    pk: rank + scores[pk]
+                    for pk, rank in ranks.items() if pk in scores
+                }
+            if not ranks:
+                return {}
+        return dict(ranks or {})
+
+    def _ensure_fresh(self):
+        version = get_version('recipe_search')
+        if version == self._version:
+            return
+        with self._lock:
+            if version != self._version:
+                self._build()
+                self._version = version
+
+    def _build(self):
+        postings = defaultdict(lambda: defaultdict(float))
+        fields = [field for field, _, _ in SEARCH_FIELDS]
+        for row in Recipe.objects.values('id', *fields).order_by():
+            for field, _, score in SEARCH_FIELDS:
+                for word in WORD_RE.findall(row[field].casefold()):
+                    postings[word][row['id']] += score
+        postings = {word: dict(scores) for word, scores in postings.items()}
+        self._index = (sorted(postings), postings)
+
+    @staticmethod
+    def _prefix_range(words, prefix):
+        start = bisect.bisect_left(words, prefix)
+        stop = bisect.bisect_left(words, prefix + UPPER_BOUND, lo=start)
+        return words[start:stop]
+
+
+recipe_search_index = RecipeSearchIndex()
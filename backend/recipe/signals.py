@@ -0,0 +1,181 @@
+from django.contrib.auth.signals import user_logged_out
+from django.db.models import F
+from django.db.models.signals import (m2m_changed, post_delete, post_save,
+                                      pre_delete)
+from django.dispatch import receiver
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
+
+from .api.authentication import auth_cache
+from .api.payload_cache import recipe_payload_cache
+from .models import (Favorite, Follow, Ingredient, IngredientRecord, Profile,
+                     Recipe, ShopList, ShopListIngredient, Tag, User)
+from .search import update_search_vectors
+from .similarity import mark_changed
+from .versions import auth_key, bump, user_key
+
+
+@receiver(post_save, sender=ShopList)
+def add_recipe_to_shop_list_totals(sender, instance, created, **kwargs):
+    if created:
+        ShopListIngredient.objects.add_recipe(
+            instance.user_id, instance.recipe_id)
+
+
+@receiver(post_delete, sender=ShopList)
+def remove_recipe_from_shop_list_totals(sender, instance, **kwargs):
+    ShopListIngredient.objects.remove_recipe(
+        instance.user_id, instance.recipe_id)
+
+
+@receiver(pre_delete, sender=Recipe)
+def remember_shop_list_users(sender, instance, **kwargs):
+    instance._shop_list_users = list(
+        instance.shopping_list.values_list('user_id', flat=True))
+
+
+@receiver(post_delete, sender=Recipe)
+def rebuild_shop_list_totals(sender, instance, **kwargs):
+    users = getattr(instance, '_shop_list_users', None)
+    if users:
+        ShopListIngredient.objects.rebuild(users)
+
+
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+@receiver(post_save, sender=Ingredient)
+@receiver(post_delete, sender=Ingredient)
+def bump_model_version(sender, **kwargs):
+    bump(sender._meta.model_name)
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def bump_user_version(sender, instance, update_fields=None, **kwargs):
+    if update_fields is None or set(update_fields) != {'last_login'}:
+        bump_model_version(sender)
+        bump(user_key(instance.pk))
+        bump(auth_key(instance.pk))
+
+
+@receiver(post_delete, sender=Token)
+def forget_token(sender, instance, **kwargs):
+    auth_cache.invalidate(('token', instance.key))
+    bump(auth_key(instance.user_id))
+
+
+@receiver(user_logged_out)
+def forget_logged_out_user(sender, user, **kwargs):
+    if user is not None:
+        bump(auth_key(user.pk))
+
+
+@receiver(post_save, sender=Favorite)
+@receiver(post_delete, sender=Favorite)
+@receiver(post_save, sender=ShopList)
+@receiver(post_delete, sender=ShopList)
+@receiver(post_save, sender=Follow)
+@receiver(post_delete, sender=Follow)
+def bump_user_relations_version(sender, instance, **kwargs):
+    bump(user_key(instance.user_id))
+
+
+def touch_recipes(recipe_ids):
+    Recipe.objects.filter(pk__in=recipe_ids).update(
+        updated_at=timezone.now())
+    mark_changed()
+
+
+@receiver(post_save, sender=IngredientRecord)
+@receiver(post_delete, sender=IngredientRecord)
+def touch_recipe_of_ingredient_record(sender, instance, **kwargs):
+    touch_recipes([instance.recipe_id])
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+def touch_recipes_of_tags(sender, instance, action, reverse, pk_set,
+                          **kwargs):
+    if not reverse and action in ('post_add', 'post_remove', 'post_clear'):
+        touch_recipes([instance.pk])
+    elif reverse and action in ('post_add', 'post_remove'):
+        touch_recipes(pk_set)
+    elif reverse and action == 'pre_clear':
+        touch_recipes(instance.recipes.values_list('id', flat=True))
+
+
+@receiver(post_delete, sender=Recipe)
+def forget_recipe_payload(sender, instance, **kwargs):
+    recipe_payload_cache.invalidate([instance.pk])
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_delete, sender=Recipe)
+def refresh_similar_recipes(sender, **kwargs):
+    mark_changed()
+
+
+@receiver(post_save, sender=Recipe)
+def refresh_search_vector(sender, instance, update_fields=None, **kwargs):
+    if update_fields is not None and {'name', 'text'}.isdisjoint(
+            update_fields):
+        return
+    update_search_vectors(Recipe.objects.filter(pk=instance.pk))
+    bump('recipe_search')
+
+
+@receiver(post_delete, sender=Recipe)
+def forget_search_entry(sender, **kwargs):
+    bump('recipe_search')
+
+
+RECIPE_COUNTERS = {
+    Favorite: 'favorites_count',
+    ShopList: 'shopping_list_count',
+}
+
+
+def shift_recipe_counter(sender, instance, delta):
+    field = RECIPE_COUNTERS[sender]
+    Recipe.objects.filter(pk=instance.recipe_id).update(
+        **{field: F(field) + delta})
+
+
+@receiver(post_save, sender=Favorite)
+@receiver(post_save, sender=ShopList)
+def increment_recipe_counter(sender, instance, created, **kwargs):
+    if created:
+        shift_recipe_counter(sender, instance, 1)
+
+
+@receiver(post_delete, sender=Favorite)
+@receiver(post_delete, sender=ShopList)
+def decrement_recipe_counter(sender, instance, **kwargs):
+    shift_recipe_counter(sender, instance, -1)
+
+
+@receiver(post_save, sender=Recipe)
+def increment_recipes_count(sender, instance, created, **kwargs):
+    if created:
+        Profile.objects.shift(instance.author_id, 'recipes_count', 1)
+
+
+@receiver(post_delete, sender=Recipe)
+def decrement_recipes_count(sender, instance, **kwargs):
+    Profile.objects.shift(instance.author_id, 'recipes_count', -1)
+
+
+@receiver(post_save, sender=Follow)
+def increment_followers_count(sender, instance, created, **kwargs):
+    if created:
+        Profile.objects.shift(instance.author_id, 'followers_count', 1)
+
+
+@receiver(post_delete, sender=Follow)
+def decrement_followers_count(sender, instance, **kwargs):
+    Profile.objects.shift(instance.author_id, 'followers_count', -1)
+
+
+@receiver(post_save, sender=User)
+def create_profile(sender, instance, created, **kwargs):
+    if created:
+        Profile.objects.get_or_create(user=instance)
@@ -0,0 +1,465 @@
+import bisect
+import heapq
+import json
+import math
+import os
+import sys
+import threading
+from array import array
+from datetime import timedelta
+from itertools import accumulate
+from operator import itemgetter
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .models import IngredientRecord, Recipe
+from .versions import bump, get_version
+
+VERSION = 'recipe_similarity'
+# Транзакция, изменившая рецепт, может закоммититься позже, чем началась
+# синхронизация, поэтому изменения перечитываются с запасом.
+SYNC_OVERLAP = timedelta(seconds=60)
+# Веса IDF пересчитываются, когда число рецептов изменилось на эту долю.
+REWEIGH_DRIFT = 0.1
+EMPTY = frozenset()
+# Снимок: строка JSON с описанием, за ней массивы int64 подряд.
+SNAPSHOT_FORMAT = 1
+
+
+def mark_changed():
+    """Повышает версию индекса после коммита текущей транзакции."""
+    transaction.on_commit(lambda: bump(VERSION))
+
+
+def _pack(rows):
+    """Строки матрицы в формате CSR: id строк, указатели и столбцы."""
+    ids, pointers, columns = array('q'), array('q', [0]), array('q')
+    for recipe_id, values in rows.items():
+        ids.append(recipe_id)
+        columns.extend(sorted(values))
+        pointers.append(len(columns))
+    return ids, pointers, columns
+
+
+def _unpack(ids, pointers, columns):
+    return {
+        recipe_id: frozenset(columns[pointers[row]:pointers[row + 1]])
+        for row, recipe_id in enumerate(ids)
+    }
+
+
+def _read_snapshot(path):
+    with open(path, 'rb') as file:
+        header = json.loads(file.readline())
+        if header['format'] != SNAPSHOT_FORMAT:
+            raise ValueError(f'Неизвестный формат снимка: {header["format"]}')
+        arrays = []
+        for length in header['lengths']:
+            values = array('q')
+            values.fromfile(file, length)
+            if header['byteorder'] != sys.byteorder:
+                values.byteswap()
+            arrays.append(values)
+    synced_at = parse_datetime(header['synced_at'])
+    if synced_at is None or len(arrays) != 6:
+        raise ValueError('Повреждённый снимок')
+    return synced_at, arrays
+
+
+def _read(recipes):
+    """Ингредиенты и теги рецептов из базы в виде разреженных строк."""
+    ingredients = {recipe_id: set() for recipe_id in recipes.values_list(
+        'id', flat=True).order_by()}
+    tags = {recipe_id: set() for recipe_id in ingredients}
+    records = IngredientRecord.objects.filter(recipe__in=recipes)
+    for recipe_id, ingredient_id in records.values_list(
+            'recipe_id', 'ingredient_id').order_by().iterator():
+        ingredients.setdefault(recipe_id, set()).add(ingredient_id)
+    through = Recipe.tags.through.objects.filter(recipe__in=recipes)
+    for recipe_id, tag_id in through.values_list(
+            'recipe_id', 'tag_id').order_by().iterator():
+        tags.setdefault(recipe_id, set()).add(tag_id)
+    return (
+        {key: frozenset(value) for key, value in ingredients.items()},
+        {key: frozenset(value) for key, value in tags.items()},
+    )
+
+
+def _push(best, limit, item):
+    if len(best) < limit:
+        heapq.heappush(best, item)
+    elif item > best[0]:
+        heapq.heapreplace(best, item)
+
+
+class SimilarRecipesIndex:
+    """Матрица «рецепт × ингредиент» процесса для поиска похожих рецептов.
+
+    Сходство — косинус векторов ингредиентов с весами IDF, умноженный на
+    1 + SIMILAR_TAG_BOOST × долю общих тегов. Кандидаты берутся из
+    обратного индекса «ингредиент → рецепты», от редких ингредиентов к
+    частым: рецепт, впервые найденный по ингредиенту, делит с исходным
+    только его и более частые ингредиенты, поэтому кандидаты, которые
+    заведомо не попадут в выдачу, отбрасываются без подсчёта сходства.
+    Для поиска по кладовой столбцы также хранятся битовыми картами:
+    совпавшие ингредиенты считаются побитовым сложением без перебора
+    рецептов.
+    Индекс загружается из снимка build_similarity_index, если он есть, а
+    после изменения версии в кэше дочитывает только рецепты с новым
+    updated_at.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+        self._version = None
+        self._synced_at = None
+        self._ingredients = {}
+        self._tags = {}
+        self._postings = {}
+        self._weights = {}
+        self._norms = {}
+        self._ranked = {}
+        self._bitmaps = {}
+        self._sizes = {}
+        self._positions = {}
+        self._row_ids = []
+        self._weighed_size = 0
+
+    def __len__(self):
+        return len(self._ingredients)
+
+    def __iter__(self):
+        return iter(list(self._ingredients))
+
+    def similar(self, recipe_id, limit=None):
+        self._ensure_fresh()
+        return self.rank(recipe_id, limit)
+
+    def cover(self, ingredient_ids, recipe_ids=None):
+        """Рецепты хотя бы с одним из ингредиентов, по группам покрытия.
+
+        Возвращает группы (доля имеющихся ингредиентов, сколько совпало,
+        битовая карта позиций рецептов) по убыванию доли и числа совпавших
+        и список id рецептов по позициям. recipe_ids ограничивает выдачу.
+        """
+        self._ensure_fresh()
+        with self._lock:
+            counts = self._count(set(ingredient_ids))
+            sizes, row_ids = dict(self._sizes), list(self._row_ids)
+            full = (1 << len(row_ids)) - 1
+            if recipe_ids is not None:
+                allowed = self._mask(recipe_ids)
+            else:
+                allowed = full
+        most = min((1 << len(counts)) - 1, max(sizes, default=0))
+        groups = []
+        for shared in range(1, most + 1):
+            exact = allowed
+            for level, plane in enumerate(counts):
+                exact &= plane if shared >> level & 1 else full ^ plane
+            for size, bitmap in sizes.items():
+                group = exact & bitmap if size >= shared else 0
+                if group:
+                    groups.append((shared / size, shared, group))
+        groups.sort(key=itemgetter(0, 1), reverse=True)
+        return groups, row_ids
+
+    def ingredients(self, recipe_ids):
+        with self._lock:
+            return {
+                recipe_id: self._ingredients.get(recipe_id, EMPTY)
+                for recipe_id in recipe_ids
+            }
+
+    def rank(self, recipe_id, limit=None):
+        limit = limit or settings.SIMILAR_RECIPES_LIMIT
+        with self._lock:
+            ingredients = self._ingredients.get(recipe_id)
+            if not ingredients:
+                return []
+            weights = {
+                ingredient_id: self._weight(ingredient_id)
+                for ingredient_id in ingredients
+            }
+            order = sorted(ingredients, key=weights.get, reverse=True)
+            remaining = list(accumulate(
+                weights[ingredient_id] for ingredient_id in reversed(order)))
+            scale = (
+                (1 + settings.SIMILAR_TAG_BOOST) / self._norms[recipe_id])
+            best, seen = [], {recipe_id}
+            for position, ingredient_id in enumerate(order):
+                self._score(recipe_id, weights, ingredient_id,
+                            remaining[-1 - position] * scale, best, seen,
+                            limit)
+            return [candidate for _, candidate in sorted(best, reverse=True)]
+
+    def _score(self, recipe_id, weights, ingredient_id, cap, best, seen,
+               limit):
+        """Добавляет в best рецепты с ингредиентом, которые могут попасть в
+        выдачу.
+
+        Рецепт, ещё не найденный по более редким ингредиентам, набирает не
+        больше cap / (его норма), а рецепты перебираются по возрастанию
+        нормы, поэтому перебор останавливается на первом непрошедшем.
+        """
+        rows, tag_rows = self._ingredients, self._tags
+        ingredients = rows[recipe_id]
+        tags = tag_rows.get(recipe_id, EMPTY)
+        boost = settings.SIMILAR_TAG_BOOST / len(tags) if tags else 0
+        base = 1 / self._norms[recipe_id]
+        floor = best[0][0] if len(best) == limit else 0
+        for norm, candidate in zip(*self._ranked_postings(ingredient_id)):
+            if cap <= floor * norm:
+                break
+            if candidate in seen:
+                continue
+            seen.add(candidate)
+            shared = sum(map(weights.get, ingredients & rows[candidate]))
+            _push(best, limit, (
+                shared * base / norm
+                * (1 + boost * len(tags & tag_rows[candidate])),
+                candidate,
+            ))
+            if len(best) == limit:
+                floor = best[0][0]
+
+    def replace(self, ingredients, tags, synced_at=None):
+        postings = {}
+        for recipe_id, values in ingredients.items():
+            for ingredient_id in values:
+                postings.setdefault(ingredient_id, set()).add(recipe_id)
+        with self._lock:
+            self._ingredients, self._tags, self._postings = (
+                ingredients, tags, postings)
+            self._reweigh()
+            self._synced_at = synced_at
+
+    def forget(self, recipe_ids):
+        with self._lock:
+            for recipe_id in recipe_ids:
+                self._remove(recipe_id)
+
+    def build(self):
+        synced_at = timezone.now()
+        self.replace(*_read(Recipe.objects.all()), synced_at)
+
+    def save(self, path=None):
+        path = path or settings.SIMILARITY_INDEX_PATH
+        with self._lock:
+            synced_at = self._synced_at
+            arrays = [*_pack(self._ingredients), *_pack(self._tags)]
+        header = {
+            'format': SNAPSHOT_FORMAT,
+            'synced_at': synced_at.isoformat(),
+            'byteorder': sys.byteorder,
+            'lengths': [len(values) for values in arrays],
+        }
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        temporary = f'{path}.tmp'
+        with open(temporary, 'wb') as file:
+            file.write(json.dumps(header).encode() + b'\n')
+            for values in arrays:
+                values.tofile(file)
+        os.replace(temporary, path)
+
+    def _ensure_fresh(self):
+        version = get_version(VERSION)
+        if version == self._version:
+            return
+        with self._refresh_lock:
+            if version == self._version:
+                return
+            if self._synced_at is None and not self._load():
+                self.build()
+            else:
+                self._sync()
+            self._version = version
+
+    def _load(self):
+        path = settings.SIMILARITY_INDEX_PATH
+        if not path or not os.path.exists(path):
+            return False
+        try:
+            synced_at, arrays = _read_snapshot(path)
+        except (ValueError, KeyError, EOFError):
+            # Повреждённый снимок или снимок старого формата.
+            return False
+        self.replace(
+            _unpack(*arrays[:3]), _unpack(*arrays[3:]), synced_at)
+        self._sync()
+        return True
+
+    def _sync(self):
+        synced_at = timezone.now()
+        ingredients, tags = _read(Recipe.objects.filter(
+            updated_at__gte=self._synced_at - SYNC_OVERLAP))
+        known = len(self._ingredients) + sum(
+            recipe_id not in self._ingredients for recipe_id in ingredients)
+        existing = None
+        if known != Recipe.objects.count():
+            existing = set(Recipe.objects.values_list('id', flat=True))
+        with self._lock:
+            for recipe_id, values in ingredients.items():
+                self._put(recipe_id, values, tags.get(recipe_id, EMPTY))
+            if existing is not None:
+                for recipe_id in self._ingredients.keys() - existing:
+                    self._remove(recipe_id)
+            drift = max(
+                abs(len(self._ingredients) - self._weighed_size),
+                len(self._row_ids) - len(self._ingredients),
+            )
+            if drift > REWEIGH_DRIFT * self._weighed_size:
+                self._reweigh()
+            self._synced_at = synced_at
+
+    def _reweigh(self):
+        self._weights, self._ranked = {}, {}
+        self._weighed_size = len(self._ingredients)
+        self._index_bitmaps()
+        self._norms = {
+            recipe_id: self._norm(recipe_id)
+            for recipe_id in self._ingredients
+        }
+
+    def _weight(self, ingredient_id):
+        """Квадрат сглаженного IDF: чем реже ингредиент, тем он весомее."""
+        weight = self._weights.get(ingredient_id)
+        if weight is None:
+            weight = self._weights[ingredient_id] = (1 + math.log(
+                (1 + self._weighed_size)
+                / (1 + len(self._postings.get(ingredient_id, EMPTY))))) ** 2
+        return weight
+
+    def _norm(self, recipe_id):
+        return math.sqrt(sum(
+            self._weight(ingredient_id)
+            for ingredient_id in self._ingredients[recipe_id]))
+
+    def _ranked_postings(self, ingredient_id):
+        """Рецепты с ингредиентом и их нормы по возрастанию нормы."""
+        ranked = self._ranked.get(ingredient_id)
+        if ranked is None:
+            norms = self._norms
+            recipe_ids = sorted(
+                self._postings[ingredient_id], key=norms.__getitem__)
+            ranked = self._ranked[ingredient_id] = (
+                array('d', map(norms.__getitem__, recipe_ids)),
+                array('q', recipe_ids),
+            )
+        return ranked
+
+    def _count(self, ingredient_ids):
+        """Побитовый счётчик: бит i плоскости k — k-й бит числа
+        ингредиентов из ingredient_ids в рецепте на позиции i."""
+        planes = []
+        for ingredient_id in ingredient_ids:
+            carry = self._bitmaps.get(ingredient_id, 0)
+            for level, plane in enumerate(planes):
+                if not carry:
+                    break
+                planes[level], carry = plane ^ carry, plane & carry
+            if carry:
+                planes.append(carry)
+        return planes
+
+    def _mask(self, recipe_ids):
+        mask = bytearray(len(self._row_ids) // 8 + 1)
+        for recipe_id in recipe_ids:
+            position = self._positions.get(recipe_id)
+            if position is not None:
+                mask[position >> 3] |= 1 << (position & 7)
+        return int.from_bytes(mask, 'little')
+
+    def _index_bitmaps(self):
+        """Битовые карты столбцов и размеров строк; позиции строк идут по
+        возрастанию id, новые рецепты получают следующие позиции."""
+        self._row_ids = sorted(self._ingredients)
+        self._positions = {
+            recipe_id: position
+            for position, recipe_id in enumerate(self._row_ids)
+        }
+        width = len(self._row_ids) // 8 + 1
+        bitmaps, sizes = {}, {}
+        for position, recipe_id in enumerate(self._row_ids):
+            byte, bit = position >> 3, 1 << (position & 7)
+            ingredients = self._ingredients[recipe_id]
+            if ingredients:
+                sizes.setdefault(len(ingredients), bytearray(width))[
+                    byte] |= bit
+            for ingredient_id in ingredients:
+                bitmaps.setdefault(ingredient_id, bytearray(width))[
+                    byte] |= bit
+        self._bitmaps = {
+            key: int.from_bytes(value, 'little')
+            for key, value in bitmaps.items()
+        }
+        self._sizes = {
+            key: int.from_bytes(value, 'little')
+            for key, value in sizes.items()
+        }
+
+    def _flip(self, recipe_id, ingredients, present):
+        if not ingredients:
+            return
+        position = self._positions.get(recipe_id)
+        if position is None:
+            position = self._positions[recipe_id] = len(self._row_ids)
+            self._row_ids.append(recipe_id)
+        bit = 1 << position
+        keys = [(self._sizes, len(ingredients))]
+        keys.extend(
+            (self._bitmaps, ingredient_id) for ingredient_id in ingredients)
+        for bitmaps, key in keys:
+            value = bitmaps.get(key, 0)
+            value = value | bit if present else value & ~bit
+            if value:
+                bitmaps[key] = value
+            else:
+                bitmaps.pop(key, None)
+
+    def _put(self, recipe_id, ingredients, tags):
+        self._remove(recipe_id)
+        self._flip(recipe_id, ingredients, True)
+        self._ingredients[recipe_id] = ingredients
+        self._tags[recipe_id] = tags
+        for ingredient_id in ingredients:
+            self._postings.setdefault(ingredient_id, set()).add(recipe_id)
+        norm = self._norms[recipe_id] = self._norm(recipe_id)
+        for ingredient_id in ingredients:
+            ranked = self._ranked.get(ingredient_id)
+            if ranked is not None:
+                position = bisect.bisect_right(ranked[0], norm)
+                ranked[0].insert(position, norm)
+                ranked[1].insert(position, recipe_id)
+
+    def _remove(self, recipe_id):
+        self._tags.pop(recipe_id, None)
+        norm = self._norms.pop(recipe_id, None)
+        if recipe_id in self._ingredients:
+            self._flip(recipe_id, self._ingredients[recipe_id], False)
+        for ingredient_id in self._ingredients.pop(recipe_id, EMPTY):
+            self._unrank(ingredient_id, recipe_id, norm)
+            recipes = self._postings.get(ingredient_id)
+            if recipes is not None:
+                recipes.discard(recipe_id)
+                if not recipes:
+                    del self._postings[ingredient_id]
+
+    def _unrank(self, ingredient_id, recipe_id, norm):
+        ranked = self._ranked.get(ingredient_id)
+        if ranked is None:
+            return
+        norms, recipe_ids = ranked
+        start = bisect.bisect_left(norms, norm)
+        for position in range(start, len(recipe_ids)):
+            if recipe_ids[position] == recipe_id:
+                del norms[position], recipe_ids[position]
+                return
+        del self._ranked[ingredient_id]
+
+
+similar_recipes_index = SimilarRecipesIndex()
@@ -0,0 +1,87 @@
+import hashlib
+import os
+import re
+import tempfile
+
+from django.core.files.storage import FileSystemStorage
+from django.utils.deconstruct import deconstructible
+
+CONTENT_ADDRESSED_NAME = re.compile(
+    r'(^|/)(?P<shard>[0-9a-f]{2}/[0-9a-f]{2})/(?P<digest>[0-9a-f]{64})'
+    r'(\.[^/]*)?$'
+)
+
+
+def is_content_addressed(name):
+    match = CONTENT_ADDRESSED_NAME.search(name)
+    return bool(match) and match['digest'].startswith(
+        match['shard'].replace('/', ''))
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    """Хранилище, которое называет файлы по sha256 их содержимого.
+
+    Файл кладётся в ``<каталог>/ab/cd/abcd….ext``; если такой файл уже
+    есть, повторная запись пропускается: у существующего файла
+    обновляется время изменения и возвращается его имя.
+    """
+
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        name = self.content_name(name, content)
+        try:
+            # Свежее время изменения не даёт gc_media удалить файл, на
+            # который новый рецепт ещё не успел сослаться.
+            os.utime(self.path(name))
+        except FileNotFoundError:
+            return super().save(name, content, max_length)
+        return name
+
+    def replace(self, name, content):
+        """Записывает файл под именем ``name``, заменяя прежний.
+
+        Нужно для производных файлов вроде уменьшенных копий: их имя
+        уже определяется хешем исходного изображения.
+        """
+        return super().save(name, content)
+
+    def get_available_name(self, name, max_length=None):
+        # Файл с тем же именем хранит то же содержимое, суффикс не нужен.
+        return name
+
+    def _save(self, name, content):
+        # Запись во временный файл и os.replace: параллельные загрузки
+        # одного содержимого просто перезаписывают файл тем же самым.
+        full_path = self.path(name)
+        directory = os.path.dirname(full_path)
+        os.makedirs(directory, exist_ok=True)
+        descriptor, temp_path = tempfile.mkstemp(
+            dir=directory, prefix='.upload-')
+        try:
+            with os.fdopen(descriptor, 'wb') as file:
+                for chunk in content.chunks():
+                    file.write(chunk)
+            os.chmod(temp_path, self.file_permissions_mode or 0o644)
+            os.replace(temp_path, full_path)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+        return name
+
+    @staticmethod
+    def content_name(name, content):
+        digest = hashlib.sha256()
+        if hasattr(content, 'seek'):
+            content.seek(0)
+        for chunk in content.chunks():
+            digest.update(chunk)
+        if hasattr(content, 'seek'):
+            content.seek(0)
+        digest = digest.hexdigest()
+        directory = os.path.dirname(name)
+        extension = os.path.splitext(name)[1].lower()
+        return os.path.join(
+            directory, digest[:2], digest[2:4], digest + extension)
@@ -0,0 +1,94 @@
+import pytest
+from django.core.cache import cache
+from django.db import connections
+from rest_framework.test import APIClient
+
+from foodgram.db.pool import pools
+
+from recipe.api.authentication import auth_cache
+from recipe.api.payload_cache import recipe_payload_cache
+from recipe.models import Ingredient, IngredientRecord, Recipe, Tag, User
+
+
+@pytest.fixture(scope='session')
+def django_db_setup(django_db_setup, django_db_blocker):
+    yield
+    # Соединения из пула держат тестовую базу открытой и не дают её удалить.
+    with django_db_blocker.unblock():
+        connections.close_all()
+    for pool in pools().values():
+        pool.close()
+
+
+@pytest.fixture(autouse=True)
+def clean_caches():
+    cache.clear()
+    recipe_payload_cache.clear()
+    auth_cache.clear()
+    yield
+    cache.clear()
+    recipe_payload_cache.clear()
+
+
+@pytest.fixture
+def user(db):
+    return User.objects.create_user(
+        username='cook', email='cook@example.com', password='password',
+        first_name='Иван', last_name='Иванов')
+
+
+@pytest.fixture
+def author(db):
+    return User.objects.create_user(
+        username='author', email='author@example.com',
+        password='password', first_name='Пётр', last_name='Петров')
+
+
+@pytest.fixture
+def client():
+    return APIClient()
+
+
+@pytest.fixture
+def user_client(user):
+    client = APIClient()
+    client.force_authenticate(user)
+    return client
+
+
+@pytest.fixture
+def tags(db):
+    return [
+        Tag.objects.create(name=f'Тег {i}', color='#E26C2D', slug=f'tag-{i}')
+        for i in range(3)
+    ]
+
+
+@pytest.fixture
+def ingredients(db):
+    return [
+        Ingredient.objects.create(
+            name=f'Ингредиент {i}', measurement_unit='г')
+        for i in range(10)
+    ]
+
+
+@pytest.fixture
+def make_recipes(author, tags, ingredients):
+    def make(count, per_recipe=3, recipe_author=None):
+        recipes = []
+        for i in range(count):
+            recipe = Recipe.objects.create(
+                author=recipe_author or author, name=f'Рецепт {i}',
+                text='Описание', image='recipes/test.jpg', cooking_time=10)
+            recipe.tags.set(tags[:1 + i % len(tags)])
+            IngredientRecord.objects.bulk_create(
+                IngredientRecord(
+                    recipe=recipe,
+                    ingredient=ingredients[(i + j) % len(ingredients)],
+                    amount=j + 1)
+                for j in range(per_recipe)
+            )
+            recipes.append(recipe)
+        return recipes
+    return make
@@ -0,0 +1,92 @@
+import pytest
+from django.contrib.auth.signals import user_logged_out
+from rest_framework.authtoken.models import Token
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.test import APIRequestFactory
+from rest_framework_simplejwt.tokens import AccessToken
+
+from recipe.api.authentication import (CachedJWTAuthentication,
+                                       CachedModelBackend,
+                                       CachedTokenAuthentication)
+
+
+def _request(header):
+    return APIRequestFactory().get('/', HTTP_AUTHORIZATION=header)
+
+
+@pytest.fixture
+def token(user):
+    return Token.objects.create(user=user)
+
+
+def _token_user(token):
+    result = CachedTokenAuthentication().authenticate(
+        _request(f'Token {token.key}'))
+    return result[0]
+
+
+@pytest.mark.django_db
+def test_warm_token_auth_runs_no_queries(
+        user, token, django_assert_num_queries):
+    assert _token_user(token) == user
+    with django_assert_num_queries(0):
+        assert _token_user(token) == user
+
+
+@pytest.mark.django_db
+def test_warm_jwt_auth_runs_no_queries(user, django_assert_num_queries):
+    request = _request(f'Token {AccessToken.for_user(user)}')
+    assert CachedJWTAuthentication().authenticate(request)[0] == user
+    with django_assert_num_queries(0):
+        assert CachedJWTAuthentication().authenticate(request)[0] == user
+
+
+@pytest.mark.django_db
+def test_warm_session_user_runs_no_queries(user, django_assert_num_queries):
+    assert CachedModelBackend().get_user(user.pk) == user
+    with django_assert_num_queries(0):
+        assert CachedModelBackend().get_user(user.pk) == user
+
+
+@pytest.mark.django_db
+def test_password_change_invalidates_cached_user(user, token):
+    _token_user(token)
+    user.set_password('another-password')
+    user.save()
+    assert _token_user(token).check_password('another-password')
+
+
+@pytest.mark.django_db
+def test_deactivated_user_is_rejected(user, token):
+    _token_user(token)
+    user.is_active = False
+    user.save()
+    with pytest.raises(AuthenticationFailed):
+        _token_user(token)
+
+
+@pytest.mark.django_db
+def test_deleted_token_is_rejected(user, token):
+    _token_user(token)
+    token.delete()
+    with pytest.raises(AuthenticationFailed):
+        _token_user(token)
+
+
+@pytest.mark.django_db
+def test_deleted_user_is_forgotten(user):
+    backend = CachedModelBackend()
+    assert backend.get_user(user.pk) == user
+    user_id = user.pk
+    user.delete()
+    assert backend.get_user(user_id) is None
+
+
+@pytest.mark.django_db
+def test_logout_invalidates_cached_session_user(
+        user, django_assert_num_queries):
+    backend = CachedModelBackend()
+    backend.get_user(user.pk)
+    user_logged_out.send(sender=type(user), request=None, user=user)
+    with django_assert_num_queries(1):
+        assert backend.get_user(user.pk) == user
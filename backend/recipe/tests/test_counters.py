@@ -0,0 +1,27 @@
+from io import StringIO
+
+import pytest
+from django.core.management import call_command
+
+from recipe.models import Favorite, Follow, Profile, Recipe
+
+
+@pytest.mark.django_db
+def test_rebuild_creates_and_reconciles_profiles_and_counters(
+        user, user_client, author, make_recipes):
+    recipe, _ = make_recipes(2)
+    Follow.objects.create(user=user, author=author)
+    Favorite.objects.create(user=user, recipe=recipe)
+    # Так выглядят данные, созданные до появления счётчиков.
+    Profile.objects.all().delete()
+    Recipe.objects.update(favorites_count=0)
+
+    call_command('reconcile_counters', stdout=StringIO())
+
+    profile = Profile.objects.get(user=author)
+    assert (profile.recipes_count, profile.followers_count) == (2, 1)
+    assert Profile.objects.filter(user=user).exists()
+    recipe.refresh_from_db()
+    assert recipe.favorites_count == 1
+    response = user_client.get('/api/users/subscriptions/')
+    assert response.json()['results'][0]['recipes_count'] == 2
@@ -0,0 +1,73 @@
+import pytest
+from rest_framework.test import APIClient
+
+from recipe.models import FeedEntry, Follow
+
+from .test_recipe_writes import GIF, _payload
+
+# Ленты обновляются после коммита, поэтому тесты идут в настоящих
+# транзакциях, а задачи выполняются без пула потоков.
+pytestmark = pytest.mark.django_db(transaction=True)
+
+
+@pytest.fixture(autouse=True)
+def inline_fan_out(settings):
+    settings.FEED_FANOUT_WORKERS = 0
+
+
+def _feed(user, author):
+    return list(FeedEntry.objects.filter(
+        user=user, author=author).values_list('recipe_id', flat=True)
+        .order_by('-recipe_id'))
+
+
+def _feed_ids(client):
+    response = client.get('/api/recipes/feed/', {'limit': 50})
+    assert response.status_code == 200, response.content
+    return [recipe['id'] for recipe in response.json()['results']]
+
+
+def test_new_recipe_is_fanned_out_to_followers(
+        user, user_client, author, tags, ingredients):
+    Follow.objects.create(user=user, author=author)
+    client = APIClient()
+    client.force_authenticate(author)
+    payload = _payload(tags, ingredients[:2])
+    payload['image'] = GIF
+    response = client.post('/api/recipes/', payload, format='json')
+    assert response.status_code == 201, response.content
+    recipe_id = response.json()['id']
+    assert _feed(user, author) == [recipe_id]
+    assert _feed_ids(user_client) == [recipe_id]
+
+
+def test_subscribe_backfills_and_unsubscribe_forgets(
+        user, user_client, author, make_recipes):
+    recipes = make_recipes(3)
+    assert user_client.get(
+        f'/api/users/{author.id}/subscribe/').status_code == 200
+    expected = sorted((recipe.id for recipe in recipes), reverse=True)
+    assert _feed(user, author) == expected
+    assert _feed_ids(user_client) == expected
+
+    assert user_client.delete(
+        f'/api/users/{author.id}/subscribe/').status_code == 204
+    assert _feed(user, author) == []
+    assert _feed_ids(user_client) == []
+
+
+def test_feed_keeps_latest_recipes_only(
+        settings, user, user_client, author, make_recipes):
+    settings.FEED_LENGTH = 2
+    recipes = make_recipes(3)
+    user_client.get(f'/api/users/{author.id}/subscribe/')
+    assert _feed(user, author) == [recipes[2].id, recipes[1].id]
+
+
+def test_popular_authors_are_read_on_demand(
+        settings, user, user_client, author, make_recipes):
+    settings.FEED_FANOUT_LIMIT = 0
+    recipes = make_recipes(2)
+    user_client.get(f'/api/users/{author.id}/subscribe/')
+    assert _feed(user, author) == []
+    assert _feed_ids(user_client) == [recipes[1].id, recipes[0].id]
@@ -0,0 +1,42 @@
+from io import BytesIO
+
+import pytest
+from django.core.files.base import ContentFile
+from PIL import Image
+
+from recipe.images import generate_renditions, image_storage, rendition_names
+from recipe.models import Recipe
+
+
+@pytest.fixture
+def media(settings, tmp_path):
+    settings.MEDIA_ROOT = str(tmp_path)
+    return tmp_path
+
+
+def _png(size=(1600, 900)):
+    buffer = BytesIO()
+    Image.new('RGB', size, '#E26C2D').save(buffer, 'PNG')
+    return ContentFile(buffer.getvalue(), name='photo.png')
+
+
+@pytest.mark.django_db
+def test_renditions_are_written_to_the_image_field_storage(media, author):
+    storage = image_storage()
+    name = storage.save('recipes/photo.png', _png())
+    recipe = Recipe.objects.create(
+        author=author, name='Борщ', text='Описание', image=name)
+
+    generate_renditions(recipe.id, name)
+
+    recipe.refresh_from_db()
+    assert recipe.image_renditions_ready
+    for extensions in rendition_names(name).values():
+        for rendition in extensions.values():
+            assert (media / rendition).is_file()
+
+    thumbnail = rendition_names(name)['thumbnail']['jpeg']
+    with storage.open(thumbnail) as file:
+        assert max(Image.open(file).size) == 480
+    generate_renditions(recipe.id, name, force=True)
+    assert (media / thumbnail).is_file()
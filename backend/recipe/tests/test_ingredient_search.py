@@ -0,0 +1,20 @@
+import pytest
+
+from recipe.models import Ingredient
+
+
+@pytest.mark.django_db
+def test_search_puts_name_prefix_before_word_prefix(client):
+    Ingredient.objects.bulk_create([
+        Ingredient(name='Сахар', measurement_unit='г'),
+        Ingredient(name='Ванильный сахар', measurement_unit='г'),
+        Ingredient(name='Соль', measurement_unit='г'),
+    ])
+    response = client.get('/api/ingredients/', {'name': 'сах'})
+    assert response.status_code == 200
+    assert [row['name'] for row in response.json()] == [
+        'Сахар', 'Ванильный сахар']
+
+    Ingredient.objects.create(name='Сахарная пудра', measurement_unit='г')
+    response = client.get('/api/ingredients/', {'name': 'сахарн'})
+    assert [row['name'] for row in response.json()] == ['Сахарная пудра']
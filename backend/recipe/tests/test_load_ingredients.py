@@ -0,0 +1,43 @@
+import json
+from io import StringIO
+
+import pytest
+from django.core.management import call_command
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from recipe.models import Ingredient
+
+
+@pytest.mark.django_db
+def test_load_reports_inserted_rows_only(tmp_path, capsys):
+    Ingredient.objects.create(name='Соль', measurement_unit='г')
+    path = tmp_path / 'ingredients.json'
+    path.write_text(json.dumps([
+        {'name': 'Соль', 'measurement_unit': 'г'},
+        {'name': 'Сахар', 'measurement_unit': 'г'},
+        {'name': 'Сахар', 'measurement_unit': 'кг'},
+        {'name': 'Молоко', 'measurement_unit': 'мл'},
+    ], ensure_ascii=False), encoding='utf-8')
+
+    call_command('load_ingredients', str(path))
+    assert 'Добавлено: 2, обновлено: 0, пропущено: 2' in (
+        capsys.readouterr().out)
+    assert Ingredient.objects.count() == 3
+
+    call_command('load_ingredients', str(path))
+    assert 'Добавлено: 0, обновлено: 0, пропущено: 4' in (
+        capsys.readouterr().out)
+
+
+@pytest.mark.django_db
+def test_load_does_not_count_the_table(tmp_path):
+    path = tmp_path / 'ingredients.csv'
+    path.write_text(
+        ''.join(f'Ингредиент {i},г\n' for i in range(5)), encoding='utf-8')
+    with CaptureQueriesContext(connection) as queries:
+        call_command(
+            'load_ingredients', str(path), batch_size=2, stdout=StringIO())
+    assert not [query['sql'] for query in queries.captured_queries
+                if 'COUNT(' in query['sql']]
+    assert Ingredient.objects.count() == 5
@@ -0,0 +1,34 @@
+import pytest
+
+
+@pytest.mark.django_db
+def test_cursor_pages_cover_recipes_without_gaps(client, make_recipes):
+    ids = sorted((recipe.id for recipe in make_recipes(7)), reverse=True)
+    seen = []
+    response = client.get('/api/recipes/', {'cursor': '', 'limit': 3})
+    while True:
+        assert response.status_code == 200
+        page = response.json()
+        seen += [recipe['id'] for recipe in page['results']]
+        if page['next'] is None:
+            break
+        response = client.get(page['next'])
+    assert seen == ids
+
+
+@pytest.mark.django_db
+def test_cursor_on_unordered_list_falls_back_to_page_numbers(
+        client, user, author):
+    response = client.get('/api/users/', {'cursor': '', 'limit': 1})
+    assert response.status_code == 200
+    page = response.json()
+    assert page['count'] == 2
+    assert len(page['results']) == 1
+    assert 'page=2' in page['next']
+
+
+@pytest.mark.django_db
+def test_broken_cursor_is_not_found(client, make_recipes):
+    make_recipes(1)
+    response = client.get('/api/recipes/', {'cursor': 'broken'})
+    assert response.status_code == 404
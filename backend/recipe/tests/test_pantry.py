@@ -0,0 +1,53 @@
+import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from recipe.similarity import SimilarRecipesIndex
+
+MASK_SQL = 'SELECT "recipe_recipe"."id" FROM "recipe_recipe"'
+
+
+@pytest.fixture(autouse=True)
+def index(settings, tmp_path, monkeypatch):
+    # Версия индекса повышается после коммита, которого в тестах нет,
+    # поэтому каждый тест строит свой индекс.
+    settings.SIMILARITY_INDEX_PATH = str(tmp_path / 'similarity.index')
+    monkeypatch.setattr(
+        'recipe.pantry.similar_recipes_index', SimilarRecipesIndex())
+
+
+@pytest.fixture
+def recipes(make_recipes, user):
+    # Рецепт i содержит ингредиенты (i + j) % 10 для j < 3.
+    return make_recipes(6), make_recipes(2, recipe_author=user)
+
+
+def _pantry(client, ingredients, **params):
+    with CaptureQueriesContext(connection) as queries:
+        response = client.get('/api/recipes/pantry/', {
+            'ingredients': [ingredient.id for ingredient in ingredients],
+            'limit': 50, **params})
+    masks = [query['sql'] for query in queries.captured_queries
+             if query['sql'].startswith(MASK_SQL)
+             and 'EXISTS' in query['sql']]
+    assert response.status_code == 200, response.content
+    return {recipe['id'] for recipe in response.json()['results']}, masks
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('params', [{}, {'tags': ''}, {'search': ''}])
+def test_pantry_without_filters_builds_no_mask(
+        client, recipes, ingredients, params):
+    theirs, mine = recipes
+    ids, masks = _pantry(client, ingredients[:3], **params)
+    assert ids == {recipe.id for recipe in theirs[:3] + mine}
+    assert masks == []
+
+
+@pytest.mark.django_db
+def test_pantry_filters_mask_recipes_with_pantry_ingredients(
+        client, recipes, ingredients, user):
+    theirs, mine = recipes
+    ids, masks = _pantry(client, ingredients[:3], author=user.id)
+    assert ids == {recipe.id for recipe in mine}
+    assert len(masks) == 1
@@ -0,0 +1,64 @@
+import pytest
+
+from recipe.api.serializers import RecipeSerializer
+
+
+@pytest.fixture
+def rendered(monkeypatch):
+    """id рецептов, чья общая часть ответа была собрана заново."""
+    ids = []
+    shared_payload = RecipeSerializer._shared_payload
+
+    def spy(payload):
+        ids.append(payload['id'])
+        return shared_payload(payload)
+
+    monkeypatch.setattr(RecipeSerializer, '_shared_payload', staticmethod(spy))
+    return ids
+
+
+@pytest.fixture
+def recipes(make_recipes, user):
+    return make_recipes(3) + make_recipes(2, recipe_author=user)
+
+
+def _render(client, rendered):
+    rendered.clear()
+    response = client.get('/api/recipes/', {'limit': 50})
+    assert response.status_code == 200, response.content
+    return set(rendered)
+
+
+@pytest.mark.django_db
+def test_payloads_are_built_once(client, recipes, rendered):
+    assert _render(client, rendered) == {recipe.id for recipe in recipes}
+    assert _render(client, rendered) == set()
+
+
+@pytest.mark.django_db
+def test_author_change_invalidates_only_their_recipes(
+        client, recipes, rendered, user):
+    _render(client, rendered)
+    user.first_name = 'Повар'
+    user.save()
+    assert _render(client, rendered) == {
+        recipe.id for recipe in recipes if recipe.author_id == user.id}
+    response = client.get(f'/api/recipes/{recipes[-1].id}/')
+    assert response.json()['author']['first_name'] == 'Повар'
+
+
+@pytest.mark.django_db
+def test_recipe_change_invalidates_its_payload(client, recipes, rendered):
+    _render(client, rendered)
+    recipes[0].name = 'Новое название'
+    recipes[0].save()
+    assert _render(client, rendered) == {recipes[0].id}
+
+
+@pytest.mark.django_db
+def test_tag_change_invalidates_all_payloads(
+        client, recipes, rendered, tags):
+    _render(client, rendered)
+    tags[0].name = 'Другой'
+    tags[0].save()
+    assert _render(client, rendered) == {recipe.id for recipe in recipes}
@@ -0,0 +1,28 @@
+import pytest
+
+from recipe.models import Favorite, Follow, ShopList
+from recipe.query_plans import (disable_sequential_scans, hot_queries,
+                                sequential_scans)
+
+HOT_QUERIES = list(hot_queries(0, 0, ''))
+
+
+@pytest.fixture
+def seeded(user, author, make_recipes, tags):
+    recipes = make_recipes(20)
+    Follow.objects.create(user=user, author=author)
+    Favorite.objects.bulk_create(
+        Favorite(user=user, recipe=recipe) for recipe in recipes[::2])
+    for recipe in recipes[::3]:
+        ShopList.objects.create(user=user, recipe=recipe)
+    return user, recipes[0], tags[0]
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('name', HOT_QUERIES)
+def test_hot_query_uses_indexes(seeded, name):
+    user, recipe, tag = seeded
+    disable_sequential_scans()
+    queryset = hot_queries(user.id, recipe.id, tag.slug)[name]
+    plan, scans = sequential_scans(queryset)
+    assert not scans, plan
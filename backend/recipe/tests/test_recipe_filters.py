@@ -0,0 +1,126 @@
+from urllib.parse import parse_qs, urlparse
+
+import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from recipe.models import Favorite, ShopList
+
+
+def _ids(response):
+    assert response.status_code == 200, response.content
+    return {recipe['id'] for recipe in response.json()['results']}
+
+
+@pytest.fixture
+def recipes(make_recipes, user):
+    # Рецепт i получает теги tags[:1 + i % 3].
+    recipes = make_recipes(6)
+    mine = make_recipes(2, recipe_author=user)
+    Favorite.objects.create(user=user, recipe=recipes[0])
+    ShopList.objects.create(user=user, recipe=recipes[1])
+    return recipes + mine
+
+
+@pytest.mark.django_db
+def test_tags_are_combined_with_or_without_duplicates(
+        client, recipes, tags):
+    params = {'tags': [tags[1].slug, tags[2].slug], 'limit': 50}
+    with CaptureQueriesContext(connection) as queries:
+        response = client.get('/api/recipes/', params)
+    # Запросы к рецептам с фильтром по тегам, без предзагрузки тегов.
+    tag_queries = [
+        query['sql'] for query in queries.captured_queries
+        if 'FROM "recipe_recipe"' in query['sql']
+        and 'recipe_recipe_tags' in query['sql']
+    ]
+    expected = {recipe.id for i, recipe in enumerate(recipes) if i % 3 > 0}
+    assert _ids(response) == expected
+    assert response.json()['count'] == len(expected)
+    assert tag_queries
+    assert all('EXISTS' in sql and 'DISTINCT' not in sql
+               for sql in tag_queries)
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('param', ['is_favorited', 'is_in_shopping_cart'])
+def test_relation_filters_for_anonymous_users(client, recipes, param):
+    assert _ids(client.get('/api/recipes/', {param: 1})) == set()
+    assert len(_ids(client.get(
+        '/api/recipes/', {param: 0, 'limit': 50}))) == len(recipes)
+
+
+@pytest.mark.django_db
+def test_relation_filters_for_authenticated_users(user_client, recipes):
+    assert _ids(user_client.get(
+        '/api/recipes/', {'is_favorited': 1})) == {recipes[0].id}
+    assert _ids(user_client.get(
+        '/api/recipes/', {'is_in_shopping_cart': 1})) == {recipes[1].id}
+    assert recipes[0].id not in _ids(user_client.get(
+        '/api/recipes/', {'is_favorited': 0, 'limit': 50}))
+
+
+@pytest.mark.django_db
+def test_author_filter_accepts_integers_only(client, recipes, user):
+    assert _ids(client.get('/api/recipes/', {'author': user.id})) == {
+        recipe.id for recipe in recipes if recipe.author_id == user.id}
+    for value in ('1.5', 'abc'):
+        response = client.get('/api/recipes/', {'author': value})
+        assert response.status_code == 400
+        assert 'author' in response.json()
+
+
+@pytest.fixture
+def searchable(recipes):
+    # Чётные рецепты называются «Борщ», остальные остаются «Рецепт».
+    for recipe in recipes[::2]:
+        recipe.name = f'Борщ {recipe.id}'
+        recipe.save()
+    return recipes
+
+
+def _cursor_ids(client, params):
+    params = {**params, 'cursor': '', 'limit': 1}
+    ids = []
+    while True:
+        response = client.get('/api/recipes/', params)
+        assert response.status_code == 200, response.content
+        ids += [recipe['id'] for recipe in response.json()['results']]
+        next_url = response.json()['next']
+        if next_url is None:
+            return ids
+        params['cursor'] = parse_qs(urlparse(next_url).query)['cursor'][0]
+
+
+def _search_cases(recipes, tags, user):
+    return [
+        ({'tags': [tags[1].slug]}, {
+            recipe.id for i, recipe in enumerate(recipes[:6])
+            if i % 2 == 0 and i % 3 > 0}),
+        ({'author': user.id}, {recipes[6].id}),
+        ({'is_favorited': 1}, {recipes[0].id}),
+        ({'is_in_shopping_cart': 1}, set()),
+    ]
+
+
+@pytest.mark.django_db
+def test_search_combines_with_other_filters(
+        user_client, searchable, tags, user):
+    found = {recipe.id for recipe in searchable[::2]}
+    assert _ids(user_client.get(
+        '/api/recipes/', {'search': 'борщ', 'limit': 50})) == found
+    for params, expected in _search_cases(searchable, tags, user):
+        params = {**params, 'search': 'борщ', 'limit': 50}
+        response = user_client.get('/api/recipes/', params)
+        assert _ids(response) == expected, params
+        assert response.json()['count'] == len(expected)
+
+
+@pytest.mark.django_db
+def test_search_combines_with_other_filters_in_cursor_mode(
+        user_client, searchable, tags, user):
+    found = sorted((recipe.id for recipe in searchable[::2]), reverse=True)
+    assert _cursor_ids(user_client, {'search': 'борщ'}) == found
+    for params, expected in _search_cases(searchable, tags, user):
+        ids = _cursor_ids(user_client, {**params, 'search': 'борщ'})
+        assert ids == sorted(expected, reverse=True), params
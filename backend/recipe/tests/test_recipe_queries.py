@@ -0,0 +1,14 @@
+import pytest
+
+LIST_QUERIES = 7
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('limit', [5, 25, 50])
+def test_recipe_list_query_count_does_not_depend_on_page_size(
+        user_client, make_recipes, django_assert_num_queries, limit):
+    make_recipes(50)
+    with django_assert_num_queries(LIST_QUERIES):
+        response = user_client.get('/api/recipes/', {'limit': limit})
+    assert response.status_code == 200
+    assert len(response.json()['results']) == limit
@@ -0,0 +1,116 @@
+import base64
+from io import StringIO
+
+import pytest
+from django.core.management import call_command
+
+from recipe.models import (Ingredient, IngredientRecord, ShopList,
+                           ShopListIngredient)
+
+GIF = 'data:image/gif;base64,' + base64.b64encode(bytes.fromhex(
+    '47494638396101000100800000000000ffffff21f9040100000000'
+    '2c00000000010001000002024401003b'
+)).decode()
+
+CREATE_QUERIES = 13
+UPDATE_QUERIES = 22
+
+
+@pytest.fixture
+def many_ingredients(db):
+    return Ingredient.objects.bulk_create(
+        Ingredient(name=f'Продукт {i}', measurement_unit='г')
+        for i in range(31)
+    )
+
+
+def _payload(tags, ingredients, amount=10):
+    return {
+        'name': 'Борщ', 'text': 'Описание', 'cooking_time': 30,
+        'tags': [tag.id for tag in tags],
+        'ingredients': [
+            {'id': ingredient.id, 'amount': amount}
+            for ingredient in ingredients
+        ],
+    }
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('tag_count, ingredient_count', [(1, 3), (3, 30)])
+def test_create_query_count_does_not_depend_on_recipe_size(
+        user_client, tags, many_ingredients, django_assert_num_queries,
+        tag_count, ingredient_count):
+    payload = _payload(tags[:tag_count], many_ingredients[:ingredient_count])
+    payload['image'] = GIF
+    with django_assert_num_queries(CREATE_QUERIES):
+        response = user_client.post('/api/recipes/', payload, format='json')
+    assert response.status_code == 201
+    assert len(response.json()['ingredients']) == ingredient_count
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('ingredient_count', [3, 30])
+def test_update_query_count_does_not_depend_on_recipe_size(
+        user, user_client, tags, many_ingredients,
+        django_assert_num_queries, ingredient_count):
+    payload = _payload(tags, many_ingredients[:ingredient_count])
+    payload['image'] = GIF
+    recipe_id = user_client.post(
+        '/api/recipes/', payload, format='json').json()['id']
+    ShopList.objects.create(user=user, recipe_id=recipe_id)
+
+    # Один ингредиент убран, один добавлен, остальные поменяли количество.
+    payload = _payload(
+        tags[:2], many_ingredients[1:ingredient_count + 1], amount=20)
+    with django_assert_num_queries(UPDATE_QUERIES):
+        response = user_client.patch(
+            f'/api/recipes/{recipe_id}/', payload, format='json')
+    assert response.status_code == 200
+    assert dict(IngredientRecord.objects.filter(
+        recipe_id=recipe_id).values_list('ingredient_id', 'amount')) == {
+        ingredient.id: 20
+        for ingredient in many_ingredients[1:ingredient_count + 1]
+    }
+
+
+@pytest.mark.django_db
+def test_unknown_tags_and_ingredients_are_rejected(
+        user_client, tags, many_ingredients):
+    payload = _payload(tags, many_ingredients[:2])
+    payload['image'] = GIF
+    payload['tags'].append(10 ** 6)
+    response = user_client.post('/api/recipes/', payload, format='json')
+    assert response.status_code == 400
+    assert 'tags' in response.json()
+
+    payload = _payload(tags, many_ingredients[:2])
+    payload['image'] = GIF
+    payload['ingredients'].append({'id': 10 ** 6, 'amount': 1})
+    response = user_client.post('/api/recipes/', payload, format='json')
+    assert response.status_code == 400
+
+
+@pytest.mark.django_db
+def test_update_shifts_shopping_lists(
+        user, author, user_client, tags, many_ingredients, make_recipes):
+    payload = _payload(tags, many_ingredients[:3])
+    payload['image'] = GIF
+    recipe_id = user_client.post(
+        '/api/recipes/', payload, format='json').json()['id']
+    # У автора в списке есть и другой рецепт с ингредиентом, который
+    # будет добавлен в изменённый рецепт.
+    other = make_recipes(1)[0]
+    IngredientRecord.objects.create(
+        recipe=other, ingredient=many_ingredients[3], amount=5)
+    ShopList.objects.create(user=user, recipe_id=recipe_id)
+    ShopList.objects.create(user=author, recipe_id=recipe_id)
+    ShopList.objects.create(user=author, recipe=other)
+
+    payload = _payload(tags, many_ingredients[1:5], amount=20)
+    response = user_client.patch(
+        f'/api/recipes/{recipe_id}/', payload, format='json')
+    assert response.status_code == 200
+    call_command('rebuild_shopping_lists', check_only=True, stdout=StringIO())
+    assert dict(ShopListIngredient.objects.filter(user=user).values_list(
+        'ingredient_id', 'amount')) == {
+        ingredient.id: 20 for ingredient in many_ingredients[1:5]}
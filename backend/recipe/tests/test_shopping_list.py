@@ -0,0 +1,111 @@
+from io import StringIO
+
+import pytest
+from django.core.management import call_command
+
+from recipe.models import IngredientRecord, ShopList, ShopListIngredient
+
+
+def _download(client, file_format):
+    response = client.get(
+        '/api/recipes/download_shopping_cart/', {'file_format': file_format})
+    assert response.status_code == 200
+    return b''.join(response.streaming_content).decode()
+
+
+@pytest.mark.django_db
+def test_large_and_fractional_amounts_are_not_in_exponent_notation(
+        user_client, make_recipes, ingredients):
+    recipe, = make_recipes(1, per_recipe=0)
+    IngredientRecord.objects.create(
+        recipe=recipe, ingredient=ingredients[0], amount=1250000)
+    IngredientRecord.objects.create(
+        recipe=recipe, ingredient=ingredients[1], amount=0.1)
+    IngredientRecord.objects.create(
+        recipe=recipe, ingredient=ingredients[2], amount=0.2)
+    response = user_client.get(f'/api/recipes/{recipe.id}/shopping_cart/')
+    assert response.status_code == 201
+
+    txt = _download(user_client, 'txt')
+    assert 'Ингредиент 0 - 1250000 г' in txt
+    assert 'Ингредиент 1 - 0.1 г' in txt
+    assert 'e+' not in txt
+    csv = _download(user_client, 'csv')
+    assert 'Ингредиент 0,1250000,г' in csv
+    assert 'Ингредиент 2,0.2,г' in csv
+
+
+def _totals(user):
+    return {
+        ingredient_id: (amount, records)
+        for ingredient_id, amount, records
+        in ShopListIngredient.objects.filter(user=user).values_list(
+            'ingredient_id', 'amount', 'records')
+    }
+
+
+@pytest.fixture
+def cart_recipes(make_recipes, ingredients):
+    first, second = make_recipes(2, per_recipe=0)
+    IngredientRecord.objects.bulk_create([
+        IngredientRecord(recipe=first, ingredient=ingredients[0], amount=100),
+        IngredientRecord(recipe=first, ingredient=ingredients[1], amount=1),
+        IngredientRecord(recipe=second, ingredient=ingredients[0], amount=50),
+    ])
+    return first, second
+
+
+@pytest.mark.django_db
+def test_add_and_remove_recipes_keep_totals(user, cart_recipes, ingredients):
+    first, second = cart_recipes
+    ShopList.objects.create(user=user, recipe=first)
+    ShopList.objects.create(user=user, recipe=second)
+    assert _totals(user) == {
+        ingredients[0].id: (150, 2), ingredients[1].id: (1, 1)}
+
+    ShopList.objects.get(user=user, recipe=first).delete()
+    assert _totals(user) == {ingredients[0].id: (50, 1)}
+
+    ShopList.objects.create(user=user, recipe=first)
+    assert _totals(user) == {
+        ingredients[0].id: (150, 2), ingredients[1].id: (1, 1)}
+
+    ShopList.objects.filter(user=user).delete()
+    assert _totals(user) == {}
+
+
+@pytest.mark.django_db
+def test_rebuild_fills_carts_created_without_totals(
+        user, cart_recipes, ingredients):
+    first, second = cart_recipes
+    ShopList.objects.bulk_create([
+        ShopList(user=user, recipe=first), ShopList(user=user, recipe=second)])
+    assert _totals(user) == {}
+
+    call_command('rebuild_shopping_lists', stdout=StringIO())
+    assert _totals(user) == {
+        ingredients[0].id: (150, 2), ingredients[1].id: (1, 1)}
+
+    ShopList.objects.get(user=user, recipe=first).delete()
+    assert _totals(user) == {ingredients[0].id: (50, 1)}
+
+
+@pytest.mark.django_db
+def test_add_recipe_retries_when_rows_appear_concurrently(
+        user, cart_recipes, ingredients, monkeypatch):
+    first, second = cart_recipes
+    ShopList.objects.create(user=user, recipe=first)
+    locked = ShopListIngredient.objects._locked_ingredients
+    calls = []
+
+    def stale_lock(*args):
+        # Первый вызов не видит строк, созданных «параллельным» запросом.
+        calls.append(args)
+        return set() if len(calls) == 1 else locked(*args)
+
+    monkeypatch.setattr(
+        ShopListIngredient.objects, '_locked_ingredients', stale_lock)
+    ShopList.objects.create(user=user, recipe=second)
+    assert len(calls) == 2
+    assert _totals(user) == {
+        ingredients[0].id: (150, 2), ingredients[1].id: (1, 1)}
@@ -0,0 +1,33 @@
+import pytest
+
+from recipe.similarity import SimilarRecipesIndex
+
+
+@pytest.fixture
+def index_path(settings, tmp_path):
+    settings.SIMILARITY_INDEX_PATH = str(tmp_path / 'var' / 'similarity.index')
+    return tmp_path / 'var' / 'similarity.index'
+
+
+@pytest.mark.django_db
+def test_snapshot_round_trip_without_pickle(make_recipes, index_path):
+    recipes = make_recipes(8)
+    built = SimilarRecipesIndex()
+    built.build()
+    built.save()
+    assert index_path.read_bytes().startswith(b'{"format": 1')
+
+    loaded = SimilarRecipesIndex()
+    for recipe in recipes:
+        assert loaded.similar(recipe.id) == built.rank(recipe.id)
+    assert len(loaded) == len(recipes)
+
+
+@pytest.mark.django_db
+def test_broken_snapshot_is_rebuilt(make_recipes, index_path):
+    recipes = make_recipes(4)
+    index_path.parent.mkdir()
+    index_path.write_bytes(b'\x80\x04\x95 not a snapshot')
+    index = SimilarRecipesIndex()
+    assert index.similar(recipes[0].id)
+    assert len(index) == len(recipes)
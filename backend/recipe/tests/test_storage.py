@@ -0,0 +1,30 @@
+import os
+
+from django.core.files.base import ContentFile
+
+from recipe.storage import ContentAddressedStorage, is_content_addressed
+
+
+def test_duplicate_upload_reuses_file_and_refreshes_mtime(tmp_path):
+    storage = ContentAddressedStorage(location=str(tmp_path))
+    name = storage.save('recipes/a.jpg', ContentFile(b'image', name='a.jpg'))
+    assert is_content_addressed(name)
+    os.utime(storage.path(name), (0, 0))
+
+    again = storage.save(
+        'recipes/b.JPG', ContentFile(b'image', name='b.JPG'))
+    assert again == name
+    assert os.path.getmtime(storage.path(name)) > 0
+    assert storage.listdir(os.path.dirname(name))[1] == [
+        os.path.basename(name)]
+
+
+def test_existing_name_is_overwritten_without_suffix(tmp_path):
+    storage = ContentAddressedStorage(location=str(tmp_path))
+    assert storage.get_available_name('recipes/x.webp') == 'recipes/x.webp'
+    storage.replace('recipes/x.webp', ContentFile(b'first'))
+    name = storage.replace('recipes/x.webp', ContentFile(b'second'))
+    assert name == 'recipes/x.webp'
+    with storage.open(name) as file:
+        assert file.read() == b'second'
+    assert storage.listdir('recipes') == ([], ['x.webp'])
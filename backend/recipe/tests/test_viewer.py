@@ -0,0 +1,70 @@
+import pytest
+
+from recipe.api import viewer as viewer_module
+from recipe.api.viewer import ViewerContext
+from recipe.models import Favorite, Follow, ShopList
+
+
+@pytest.fixture
+def recipes(make_recipes, user, author):
+    recipes = make_recipes(8)
+    Favorite.objects.bulk_create(
+        Favorite(user=user, recipe=recipe) for recipe in recipes[::2])
+    ShopList.objects.bulk_create(
+        ShopList(user=user, recipe=recipe) for recipe in recipes[:3])
+    Follow.objects.create(user=user, author=author)
+    return recipes
+
+
+def _flags(recipes):
+    return {
+        recipe.id: (i % 2 == 0, i < 3) for i, recipe in enumerate(recipes)
+    }
+
+
+@pytest.mark.django_db
+def test_relation_above_set_limit_is_probed_per_id(
+        user, recipes, monkeypatch, django_assert_num_queries):
+    monkeypatch.setattr(viewer_module, 'SET_LIMIT', 2)
+    viewer = ViewerContext(user)
+    for recipe_id, (favorited, in_cart) in _flags(recipes).items():
+        assert viewer.favorited(recipe_id) == favorited
+        assert viewer.in_cart(recipe_id) == in_cart
+    assert viewer.follows(recipes[0].author_id)
+    # Уже проверенные id повторно не запрашиваются.
+    with django_assert_num_queries(0):
+        assert viewer.favorited(recipes[0].id)
+        assert not viewer.favorited(recipes[1].id)
+
+
+@pytest.mark.django_db
+def test_list_above_set_limit(user_client, recipes, monkeypatch):
+    monkeypatch.setattr(viewer_module, 'SET_LIMIT', 2)
+    response = user_client.get('/api/recipes/', {'limit': 50})
+    assert {
+        recipe['id']: (recipe['is_favorited'], recipe['is_in_shopping_cart'])
+        for recipe in response.json()['results']
+    } == _flags(recipes)
+    assert all(recipe['author']['is_subscribed']
+               for recipe in response.json()['results'])
+
+
+@pytest.mark.django_db
+def test_page_larger_than_probe_batch_is_primed_in_one_query(
+        user, user_client, recipes, monkeypatch, django_assert_num_queries):
+    monkeypatch.setattr(viewer_module, 'PROBE_BATCH', 3)
+    viewer = ViewerContext(user)
+    recipe_ids = [recipe.id for recipe in recipes]
+    with django_assert_num_queries(1):
+        viewer.prime(favorite=recipe_ids, cart=recipe_ids)
+    with django_assert_num_queries(0):
+        assert {
+            recipe_id: (viewer.favorited(recipe_id), viewer.in_cart(recipe_id))
+            for recipe_id in recipe_ids
+        } == _flags(recipes)
+
+    response = user_client.get('/api/recipes/', {'limit': 50})
+    assert {
+        recipe['id']: (recipe['is_favorited'], recipe['is_in_shopping_cart'])
+        for recipe in response.json()['results']
+    } == _flags(recipes)
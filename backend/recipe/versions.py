@@ -0,0 +1,31 @@
+from django.core.cache import cache
+
+KEY_PREFIX = 'recipe:version:'
+
+
+def _key(name):
+    return f'{KEY_PREFIX}{name}'
+
+
+def bump(name):
+    try:
+        cache.incr(_key(name))
+    except ValueError:
+        cache.set(_key(name), 1, None)
+
+
+def get_version(name):
+    return cache.get_or_set(_key(name), 0, None)
+
+
+def get_versions(*names):
+    versions = cache.get_many([_key(name) for name in names])
+    return tuple(versions.get(_key(name), 0) for name in names)
+
+
+def user_key(user_id):
+    return f'user:{user_id}'
+
+
+def auth_key(user_id):
+    return f'auth:{user_id}'